@@ -1,9 +1,10 @@
+import atexit
 import json
-import math
 import os
 import platform
 import re
 import shutil
+import signal
 import socket
 import subprocess
 import tarfile
@@ -15,12 +16,16 @@ import urllib.request
 import uuid
 import zipfile
 from flask import Flask, jsonify, request, send_from_directory
-from led_driver import LedStrip, hex_to_rgb
-from snmp_poller import SnmpPoller
-from udp_sync import UdpSync
+from led_driver import LedStrip, ColorPalette, hex_to_rgb
+import compositor
+from scheduler import RenderScheduler
+from effects import EffectEngine, EFFECTS, BASE_KEY
+from snmp_poller import PollerGroup, targets_from_config
+from udp_sync import UdpSync, SharedClock, follows_ports
 from display import SmallDisplay
 from app_context import AppContext
 from temps import TempMonitor, probe_bmp280
+from startup import BootTracker
 
 BASE_DIR = os.path.dirname(__file__)
 DEFAULT_CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
@@ -99,158 +104,126 @@ def _auto_disable_missing_bmp280(cfg):
     return cfg
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+# Staged startup: only cheap construction happens here; hardware init, the first
+# SNMP poll and the boot animation run on background threads (see /api/ready).
+boot = BootTracker()
+boot.begin('config')
 cfg = _auto_disable_missing_bmp280(_ensure_device_name(load_config()))
+boot.done('config')
 stop_event = threading.Event()
 
-# Shared runtime state
-runtime_lock = threading.Lock()
-runtime = {
-    "identify_on": False,         # global identify toggle
-    "port_flash": {},             # {port: {"start": ts, "period": sec, "pulses": n}} pulse override
-}
+anim_clock = SharedClock()   # animation time: local, or the sync master's once a slave has synced
+
+# Shared runtime state: LED effect layers (link pulse, identify, port flashes, ...)
+fx_engine = EffectEngine(clock=anim_clock.now)
 
 # Temps
 tempmon = TempMonitor(cfg); tempmon.start()
-
-# Display (optional)
-disp = SmallDisplay(cfg.get('display', {}))
+boot.watch('temps', tempmon.ready)
+
+# Display (optional): SPI device init and splash happen off the boot path
+disp = None
+def _start_display():
+    global disp
+    d = SmallDisplay(cfg.get('display', {}))
+    d.start()
+    disp = d
 if cfg.get('display',{}).get('enabled', False):
-    disp.start()
+    boot.run('display', _start_display)
 
-# LEDs
+# LEDs: hardware init is deferred to the render thread
 port_count = cfg['device']['ports']['count']
 leds_per_port = cfg['device'].get('leds_per_port', 2)
 strip = LedStrip(port_count, leds_per_port,
     pin=cfg['led']['pin'], brightness=cfg['led']['brightness'],
     strip_type=cfg['led'].get('type','ws2812b'),
-    color_order=cfg['led'].get('color_order','GRB'))
-try:
-    # modest 1.2s rainbow boot
-    strip.rainbow_cycle(duration_sec=1.2)
-except Exception:
-    pass
-
-# SNMP poller
-poller = SnmpPoller(host=cfg['device']['switch_host'],
-                    community=cfg['device']['snmp']['community'],
-                    interval_sec=cfg['polling']['interval_sec'],
-                    port_count=port_count, stop_event=stop_event)
+    color_order=cfg['led'].get('color_order','GRB'),
+    gamma=cfg['led'].get('gamma', 1.0),
+    white_balance=cfg['led'].get('white_balance'),
+    channels=cfg['led'].get('channels'),
+    backend=os.environ.get('ETHERLIGHT_LED_BACKEND') or cfg['led'].get('backend'),
+    record_frames=cfg['led'].get('record_frames', 600),
+    defer_begin=True)
+
+def _poll_options(c):
+    pc = c.get('polling') or {}
+    return dict(interval_sec=pc.get('interval_sec', 60),
+                fast_interval_sec=pc.get('fast_interval_sec', 1.0),
+                max_inflight=pc.get('max_inflight', 4),
+                max_repetitions=pc.get('max_repetitions', 25),
+                counters=pc.get('counters'),
+                request_timeout_sec=pc.get('request_timeout_sec', 1.0),
+                request_retries=pc.get('request_retries', 1),
+                backoff_max_sec=pc.get('backoff_max_sec', 30),
+                stale_after_sec=pc.get('stale_after_sec', 10),
+                temp_interval_sec=pc.get('temp_interval_sec', 30))
+
+def _poll_targets(c):
+    """Switches this Pi polls itself; none when it follows the sync master's port feed."""
+    return [] if follows_ports(c) else targets_from_config(c)
+
+# SNMP poller (one or more switches on one loop): first poll runs concurrently with LED/display init
+poller = PollerGroup(_poll_targets(cfg), stop_event=stop_event,
+                     traps=cfg['polling'].get('traps'), **_poll_options(cfg))
 poller.start()
+boot.watch('snmp', poller.ready)
 
 # Context + sync
 ctx = AppContext.init(CONFIG_PATH, poller=poller, temp_monitor=tempmon)
-syncer = UdpSync(lambda: ctx.get_cfg_snapshot()); syncer.start()
-
-def choose_link_color(speed_mbps, up, link_colors):
-    if not up or not speed_mbps:
-        return hex_to_rgb(link_colors.get('down','#000000'))
-    buckets = ['10','100','1000','2500','10000']
-    chosen = None
-    for b in buckets:
-        if str(speed_mbps) == b:
-            chosen = b; break
-    if chosen is None: chosen = '1000'
-    return hex_to_rgb(link_colors.get(chosen, '#00C853'))
-
-def choose_vlan_color(vlan, vlan_colors):
-    if vlan is None: return (16,16,16)
-    return hex_to_rgb(vlan_colors.get(str(vlan), '#101010'))
-
-def _clamp(x, lo=0.0, hi=1.0):
-    return hi if x>hi else lo if x<lo else x
-
-def _pulse_factor(cfg_local, now):
-    p = (cfg_local.get('pulse') or {})
-    period = max(0.5, (p.get('period_ms', 2000)/1000.0))
-    lo     = float(p.get('min', 0.15))
-    hi     = float(p.get('max', 1.0))
-    shape  = (p.get('shape','sine') or 'sine').lower()
-    t = (now % period) / period  # 0..1
-    if shape == 'triangle':
-        f = 1.0 - abs(2.0*t - 1.0)  # 0→1→0
-    else:  # sine
-        f = 0.5*(1.0 + math.sin(2*math.pi*t - math.pi/2))  # 0..1 starting low
-    f = lo + (hi - lo) * _clamp(f,0,1)
-    return _clamp(f,0,1)
-
-def _scale_rgb(rgb, f):
-    r,g,b = rgb
-    return (int(r*f), int(g*f), int(b*f))
+syncer = UdpSync(ctx.get_cfg, bus=poller.bus, clock=anim_clock)  # port state fan-out reads/feeds the poller's bus
+atexit.register(ctx.flush_cfg)  # write out colours a sync slave has not persisted yet
+
+def _on_sigterm(signum, frame):
+    # systemd stops the unit with SIGTERM, whose default action skips atexit;
+    # exit normally so the atexit handlers (config flush, LED driver release) run
+    raise SystemExit(0)
+
+if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, _on_sigterm)
+boot.run('sync', syncer.start, background=False)
+
+# VLAN/link colours compiled to packed strip values; rebuilt only on config change
+palette = ColorPalette(strip.pack)
+
+# Whole-frame numpy compositor; falls back to per-pixel rendering without numpy
+frame_comp = compositor.FrameCompositor(strip) if compositor.available() else None
+
+# Frame pacing: full rate while animating, idle rate (or an explicit wake) otherwise
+_render_cfg = cfg.get('render') or {}
+render_sched = RenderScheduler(fps=_render_cfg.get('fps', 25), idle_fps=_render_cfg.get('idle_fps', 2),
+                               stop_event=stop_event)
+
+def _init_leds():
+    strip.begin()
+    # modest 1.2s rainbow boot, drawn by the render loop as an effect layer
+    fx_engine.start('rainbow', key='boot', duration=1.2)
 
 def render_loop():
+    boot.run('leds', _init_leds, background=False)
     while not stop_event.is_set():
-        state = poller.get_state()
-        cfg_local = ctx.get_cfg_snapshot()
-
-        # If identify is ON -> pulse all LEDs white, ignore normal rendering
-        with runtime_lock:
-            ident = runtime["identify_on"]
-            port_flash = dict(runtime["port_flash"])
-
-        now = time.time()
-        if ident:
-            f = _pulse_factor(cfg_local, now)
-            white = (255,255,255)
-            rgb = _scale_rgb(white, f)
-            for k in range(strip.total):
-                strip._set_rgb(k, rgb)
-            strip.show()
-            time.sleep(0.04)
-            continue
-
-        # Normal render: VLAN (slot0) solid, Link (slot1) pulses instead of blinks
-        vlan_colors = cfg_local.get('vlan_colors', {})
-        link_colors = cfg_local.get('link_colors', {})
-        port_count  = cfg_local['device']['ports']['count']
-        leds_pp     = cfg_local['device'].get('leds_per_port', 2)
-
-        # Pulse factor for link LEDs
-        pf = _pulse_factor(cfg_local, now)
-
-        for port in range(1, port_count+1):
-            s = state.get(port, {})
-            vlan = s.get('vlan'); up = s.get('up', False); speed = s.get('speed')
-
-            # Port-level 3s flash override?
-            flash_cfg = port_flash.get(port)
-            if flash_cfg:
-                if isinstance(flash_cfg, dict):
-                    start = float(flash_cfg.get('start', now))
-                    period = max(0.15, float(flash_cfg.get('period', 0.6)))
-                    pulses = max(1, int(flash_cfg.get('pulses', 3)))
-                    elapsed = now - start
-                    total = pulses * period
-                    if elapsed < total:
-                        phase = (elapsed % period) / period
-                        f = 0.5 * (1.0 - math.cos(2 * math.pi * phase))
-                        rgb = _scale_rgb((255, 255, 255), f)
-                        strip.set_port_led(port, 0, rgb)
-                        if leds_pp >= 2:
-                            strip.set_port_led(port, 1, rgb)
-                        continue
-                else:
-                    flash_until = float(flash_cfg)
-                    if now < flash_until:
-                        # Solid bright white on both LEDs for this port
-                        strip.set_port_led(port, 0, (255,255,255))
-                        if leds_pp >= 2: strip.set_port_led(port, 1, (255,255,255))
-                        continue
-                # cleanup expired
-                with runtime_lock:
-                    runtime["port_flash"].pop(port, None)
-
-            # VLAN LED (slot 0)
-            vlan_rgb = choose_vlan_color(vlan, vlan_colors)
-            strip.set_port_led(port, 0, vlan_rgb)
-
-            # Link LED (slot 1) = pulse color (never fully off)
-            if leds_pp >= 2:
-                base_rgb = choose_link_color(speed, up, link_colors)
-                strip.set_port_led(port, 1, _scale_rgb(base_rgb, pf))
-
-        strip.show()
-        time.sleep(0.04)
+        try:
+            render_sched.begin_frame()
+            strip.begin_frame()
+            state_at = time.monotonic()
+            state_ver, state = poller.bus.snapshot()  # shared read-only view, no per-frame copy
+            cfg_local = ctx.get_cfg()
+            r_cfg = cfg_local.get('render') or {}
+            render_sched.configure(r_cfg.get('fps'), r_cfg.get('idle_fps'))
+
+            # Every effect layer is evaluated once for this frame
+            leds_pp = cfg_local['device'].get('leds_per_port', 2)
+            fx = fx_engine.evaluate(anim_clock.now(), cfg_local, leds_pp)
+            compositor.render_frame(strip, palette, frame_comp, fx, state, cfg_local, state_ver)
 
+            strip.show()
+            poller.frame_shown(state_at)
+            render_sched.end_frame(animating=fx.animating)
+        except Exception as e:
+            # one bad layer or config value must not stop rendering for good
+            print(f"[render] frame failed: {e}")
+            stop_event.wait(0.5)
+
+poller.add_listener(render_sched.wake)  # trap-driven link changes skip the idle wait
 renderer = threading.Thread(target=render_loop, daemon=True); renderer.start()
 
 # -------------------- Routes --------------------
@@ -274,13 +247,27 @@ def api_reload():
 
 @app.route('/api/config', methods=['GET','POST'])
 def api_config():
-    if request.method == 'GET': return jsonify(ctx.get_cfg_snapshot())
+    if request.method == 'GET': return jsonify(ctx.get_cfg())
     data = request.get_json(force=True)
     s_cfg = (data.get('sensors') or {}).get('bmp280') or {}
     if s_cfg.get('enabled', False) and 'auto_disabled' in s_cfg:
         s_cfg.pop('auto_disabled', None)
         data.setdefault('sensors', {})['bmp280'] = s_cfg
     save_config(data); ctx.load_cfg()
+    try:
+        led_cfg = data.get('led') or {}
+        strip.configure(brightness=led_cfg.get('brightness'), gamma=led_cfg.get('gamma'),
+                        white_balance=led_cfg.get('white_balance'))
+    except Exception:
+        pass
+    render_sched.wake()
+    syncer.kick()
+    try:
+        new_cfg = ctx.get_cfg()
+        poller.configure(targets=_poll_targets(new_cfg),
+                         traps=(new_cfg.get('polling') or {}).get('traps'), **_poll_options(new_cfg))
+    except Exception:
+        pass
     try:
         tempmon.apply_config(data)
     except Exception:
@@ -288,7 +275,44 @@ def api_config():
     return jsonify({'ok': True})
 
 @app.get('/api/state')
-def api_state(): return jsonify(poller.get_state())
+def api_state():
+    """
+    Port state {port: {...}}. With ?since=<version> returns only what changed:
+    {version, changed, removed, full}; add &wait=<s> to long-poll until a change.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        version, view = poller.bus.snapshot()
+        resp = jsonify(view)
+        resp.headers['X-State-Version'] = str(version)
+        return resp
+    wait = min(30.0, max(0.0, request.args.get('wait', 0.0, type=float)))
+    if wait:
+        poller.bus.wait(since, wait)
+    version, changed, removed, full = poller.bus.changes_since(since)
+    return jsonify({'version': version, 'changed': changed, 'removed': removed, 'full': full})
+
+@app.get('/api/ready')
+def api_ready():
+    snap = boot.snapshot()
+    return jsonify(snap), (200 if snap['ready'] else 503)
+
+@app.get('/api/render/stats')
+def api_render_stats():
+    return jsonify({'strip': strip.get_stats(), 'scheduler': render_sched.get_stats()})
+
+@app.get('/api/traffic')
+def api_traffic():
+    """Rate history per port: {port: [[t, in_bps, out_bps], ...]} (optionally ?port=N)."""
+    want = request.args.get('port', type=int)
+    ports = [want] if want is not None else sorted(poller.get_state())
+    return jsonify({port: poller.traffic_history(port) for port in ports})
+
+@app.get('/api/poller/stats')
+def api_poller_stats(): return jsonify(poller.get_stats())
+
+@app.get('/api/sync/stats')
+def api_sync_stats(): return jsonify(syncer.get_stats())
 
 @app.get('/api/temps')
 def api_temps(): return jsonify(tempmon.get_snapshot())
@@ -304,16 +328,18 @@ def api_test_set():
 @app.route('/api/identify', methods=['GET','POST'])
 def api_identify():
     if request.method == 'GET':
-        with runtime_lock: return jsonify({'on': runtime['identify_on']})
+        return jsonify({'on': fx_engine.active('identify')})
     # POST: toggle or set explicit state
     try: body = request.get_json(force=True)
     except Exception: body = {}
-    with runtime_lock:
-        if 'on' in (body or {}):
-            runtime['identify_on'] = bool(body['on'])
-        else:
-            runtime['identify_on'] = not runtime['identify_on']
-    return jsonify({'ok': True, 'on': runtime['identify_on']})
+    if 'on' in (body or {}):
+        on = bool(body['on'])
+    else:
+        on = not fx_engine.active('identify')
+    if on: fx_engine.start('identify')
+    else: fx_engine.stop('identify')
+    render_sched.wake()
+    return jsonify({'ok': True, 'on': on})
 
 # Per-port 3s white flash
 @app.post('/api/port_blink')
@@ -327,10 +353,9 @@ def api_port_blink():
         pulses = max(1, int(round(duration / max(0.15, period_ms / 1000.0))))
     period = max(0.15, period_ms / 1000.0)
     pulses = max(1, pulses)
-    start = time.time()
     duration = pulses * period
-    with runtime_lock:
-        runtime['port_flash'][port] = {'start': start, 'period': period, 'pulses': pulses}
+    fx_engine.start('flash', key=f'flash:{port}', ports=[port], period=period, pulses=pulses)
+    render_sched.wake()
     return jsonify({
         'ok': True,
         'port': port,
@@ -339,6 +364,37 @@ def api_port_blink():
         'period_ms': int(period * 1000),
     })
 
+# Effect layers: list, start by name, stop by key
+@app.route('/api/effects', methods=['GET','POST'])
+def api_effects():
+    if request.method == 'GET':
+        return jsonify({'available': sorted(EFFECTS), 'active': fx_engine.describe()})
+    data = request.get_json(force=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'ok': False, 'error': 'expected a JSON object'}), 400
+    name = str(data.pop('name', ''))
+    key = str(data.pop('key', None) or name)
+    if key == BASE_KEY:
+        return jsonify({'ok': False, 'error': f"key {BASE_KEY!r} is reserved for the link pulse"}), 400
+    try:
+        if 'duration_ms' in data:
+            data['duration'] = float(data.pop('duration_ms')) / 1000.0
+        fx_engine.start(name, key=key, **data)
+    except KeyError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    render_sched.wake()
+    return jsonify({'ok': True, 'key': key})
+
+@app.delete('/api/effects/<key>')
+def api_effects_stop(key):
+    if key == BASE_KEY:
+        return jsonify({'ok': False, 'error': f"key {BASE_KEY!r} is reserved for the link pulse"}), 400
+    ok = fx_engine.stop(key)
+    render_sched.wake()
+    return jsonify({'ok': ok})
+
 # Auto-detect switch
 # --- Detect switch -----------------------------------------------------------
 @app.post('/api/detect_switch')
@@ -1,5 +1,35 @@
 import threading, json, time
 
+class _FrozenDict(dict):
+    """Read-only dict used for published config snapshots (still JSON-serialisable)."""
+    __slots__ = ()
+    def _readonly(self, *_a, **_k):
+        raise TypeError("config snapshots are read-only; use AppContext.get_cfg_snapshot() to edit")
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+    def __deepcopy__(self, memo):
+        return thaw(self)
+    def __reduce__(self):
+        return (dict, (thaw(self),))
+
+class ConfigSnapshot(_FrozenDict):
+    """Immutable config published by AppContext; `generation` increases on every swap."""
+    __slots__ = ("generation",)
+
+def freeze(obj):
+    if isinstance(obj, dict):
+        return _FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+def thaw(obj):
+    """Deep mutable copy of a (possibly frozen) config."""
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
 class AppContext:
     _inst = None
     _lock = threading.Lock()
@@ -7,7 +37,12 @@ class AppContext:
     def __init__(self, cfg_path, poller=None, temp_monitor=None):
         self.cfg_path = cfg_path
         self._cfg_lock = threading.Lock()
-        self._cfg = self._load_cfg()
+        self._generation = 0
+        self._cfg = None
+        self._disk = None               # content last read from / written to cfg_path
+        self._persist_timer = None
+        self._persist = {"deferred": 0, "writes": 0, "skipped": 0}
+        self._publish(self._load_cfg())
         self._poller = poller
         self._temp_monitor = temp_monitor
 
@@ -30,32 +65,100 @@ class AppContext:
 
     def _load_cfg(self):
         with open(self.cfg_path, "r") as f:
-            return json.load(f)
+            self._disk = json.load(f)
+        return thaw(self._disk)
+
+    def _publish(self, cfg):
+        """Swap in a new immutable snapshot (caller holds _cfg_lock or is __init__)."""
+        snap = ConfigSnapshot((k, freeze(v)) for k, v in cfg.items())
+        self._generation += 1
+        snap.generation = self._generation
+        self._cfg = snap
+        return snap
 
     def load_cfg(self):
         with self._cfg_lock:
-            self._cfg = self._load_cfg()
-            return self._cfg
+            return self._publish(self._load_cfg())
+
+    def _write_cfg(self, cfg):
+        """Atomically replace cfg_path (caller holds _cfg_lock)."""
+        import tempfile, os, json as _j
+        d = os.path.dirname(self.cfg_path) or "."
+        fd, tmp = tempfile.mkstemp(prefix="config.", suffix=".json", dir=d)
+        with os.fdopen(fd, "w") as f:
+            _j.dump(cfg, f, indent=2)
+        os.replace(tmp, self.cfg_path)
+        self._disk = thaw(cfg)
 
     def save_cfg(self, cfg):
         with self._cfg_lock:
-            import tempfile, os, json as _j
-            d = os.path.dirname(self.cfg_path) or "."
-            fd, tmp = tempfile.mkstemp(prefix="config.", suffix=".json", dir=d)
-            with os.fdopen(fd, "w") as f:
-                _j.dump(cfg, f, indent=2)
-            os.replace(tmp, self.cfg_path)
-            self._cfg = cfg
+            self._write_cfg(cfg)
+            return self._publish(cfg)
 
-    def get_cfg_snapshot(self):
+    def apply_cfg(self, changes, persist_after=None):
+        """
+        Merge `changes` (top-level keys) into the current config under the lock and
+        publish the result in memory right away (no disk write). With persist_after
+        (seconds), write it once no further call has arrived for that long (each call
+        restarts the timer); nothing is written if the file already has this content.
+        """
+        with self._cfg_lock:
+            cfg = thaw(self._cfg)
+            cfg.update(changes)
+            snap = self._publish(cfg)
+            if persist_after is not None:
+                self._persist["deferred"] += 1
+                if self._persist_timer is not None:
+                    self._persist_timer.cancel()
+                t = threading.Timer(max(0.0, float(persist_after)), lambda: self._flush_deferred(t))
+                t.daemon = True
+                self._persist_timer = t
+                t.start()
+            return snap
+
+    def _flush_deferred(self, timer):
         with self._cfg_lock:
-            import json as _j
-            return _j.loads(_j.dumps(self._cfg))
+            if self._persist_timer is not timer:
+                return      # restarted (or flushed) while this one was firing
+        self.flush_cfg()
+
+    def flush_cfg(self):
+        """Write the in-memory config now if it differs from the file. Returns True if written."""
+        with self._cfg_lock:
+            if self._persist_timer is not None:
+                self._persist_timer.cancel()
+                self._persist_timer = None
+            cfg = thaw(self._cfg)
+            if cfg == self._disk:
+                self._persist["skipped"] += 1
+                return False
+            self._write_cfg(cfg)
+            self._persist["writes"] += 1
+            return True
+
+    def get_persist_stats(self):
+        with self._cfg_lock:
+            out = dict(self._persist)
+            out["pending"] = self._persist_timer is not None
+            return out
+
+    def get_cfg(self):
+        """Current immutable snapshot, no copy. Compare .generation to detect changes."""
+        return self._cfg
+
+    @property
+    def cfg_generation(self):
+        return self._cfg.generation
+
+    def get_cfg_snapshot(self):
+        """Mutable deep copy, for read-modify-write callers (pair with save_cfg())."""
+        return thaw(self._cfg)
 
     def get_state_snapshot(self):
+        """Current port state from the poller's change bus (shared, treat as read-only)."""
         if not self._poller:
             return {}
-        return self._poller.get_state()
+        return self._poller.bus.snapshot()[1]
 
     def get_temp_snapshot(self):
         if not self._temp_monitor:
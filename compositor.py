@@ -0,0 +1,145 @@
+from traffic import util_level
+
+try:
+    import numpy as np
+    _HAS_NP = True
+except Exception:
+    np = None
+    _HAS_NP = False
+
+def available():
+    return _HAS_NP
+
+class FrameCompositor:
+    """
+    Builds the normal port frame (VLAN slot 0, pulsed link slot 1, per-port
+    colour overrides from effects) as whole-frame arrays and writes it into the LedStrip framebuffer
+    in one go. Output is identical to the per-pixel set_port_led() path.
+    """
+    def __init__(self, strip):
+        if not _HAS_NP:
+            raise RuntimeError("numpy not available")
+        self.strip = strip
+        self._view = np.frombuffer(strip.frame_buffer(), dtype=np.uintc).reshape(
+            strip.port_count, strip.leds_per_port)
+        self._key = None
+        self._state = None
+        self._version = None
+        self._vlan = None   # (P,3) uint8 base VLAN colours
+        self._link = None   # (P,3) float64 base link colours, ready for scaling
+
+    def _rebuild_base(self, state, palette, ports):
+        vlan = np.zeros((ports, 3), dtype=np.uint8)
+        link = np.zeros((ports, 3), dtype=np.float64)
+        for p in range(ports):
+            s = state.get(p + 1, {})
+            vlan[p] = palette.vlan_rgb(s.get('vlan'))
+            link[p] = palette.link_rgb(s.get('speed'), s.get('up', False), s.get('stale', False))
+        self._vlan, self._link = vlan, link
+
+    def _pack(self, rgb):
+        """(N,3) uint8 -> (N,) packed uint32, with RGBW white extraction if needed."""
+        c = rgb.astype(np.uint32)
+        if self.strip.is_rgbw:
+            w = c.min(axis=1)
+            c = c - w[:, None]
+            return (w << 24) | (c[:, 0] << 16) | (c[:, 1] << 8) | c[:, 2]
+        return (c[:, 0] << 16) | (c[:, 1] << 8) | c[:, 2]
+
+    def render(self, state, palette, port_count, leds_pp, pf, overrides, link_levels=None, version=None):
+        """
+        state: poller state {port: {...}}, pf: link pulse factor,
+        overrides: {port: (r,g,b)} painted over both slots (e.g. port flashes),
+        link_levels: optional {port: level} used instead of pf (utilisation mode),
+        version: state bus version of `state`; when given, an unchanged version skips the state compare.
+        """
+        ports = max(0, min(int(port_count), self.strip.port_count))
+        if ports == 0:
+            return
+        key = (palette.generation, ports)
+        if version is not None:
+            dirty = version != self._version
+        else:
+            dirty = state is not self._state and state != self._state
+        if key != self._key or dirty:
+            self._rebuild_base(state, palette, ports)
+            self._key = key
+            self._state = state
+            self._version = version
+
+        slot0 = self._vlan.copy()
+        if link_levels:
+            f = np.array([link_levels.get(p + 1, pf) for p in range(ports)], dtype=np.float64)
+            slot1 = (self._link * f[:, None]).astype(np.uint8)
+        else:
+            slot1 = (self._link * pf).astype(np.uint8)
+
+        idx = [p - 1 for p in overrides if 1 <= p <= ports]
+        if idx:
+            rgb = np.array([overrides[i + 1] for i in idx], dtype=np.uint8)
+            slot0[idx] = rgb
+            slot1[idx] = rgb
+
+        view = self._view
+        view[:ports, 0] = self._pack(slot0)
+        if leds_pp >= 2:
+            view[:ports, min(1, self.strip.leds_per_port - 1)] = self._pack(slot1)
+
+def render_ports(strip, palette, state, port_count, leds_pp, overrides, link_levels=None):
+    """Per-pixel fallback for FrameCompositor.render(); palette.begin_frame() must have run."""
+    for port in range(1, port_count+1):
+        s = state.get(port, {})
+
+        # Port-level effect override (e.g. white flash) on both LEDs
+        rgb = overrides.get(port)
+        if rgb is not None:
+            strip.set_port_led(port, 0, rgb)
+            if leds_pp >= 2:
+                strip.set_port_led(port, 1, rgb)
+            continue
+
+        # VLAN LED (slot 0)
+        strip.set_port_packed(port, 0, palette.vlan(s.get('vlan')))
+
+        # Link LED (slot 1) = pulse color (never fully off); link_colors.stale once data is too old
+        if leds_pp >= 2:
+            lvl = link_levels.get(port) if link_levels else None
+            stale = s.get('stale', False)
+            if lvl is None:
+                strip.set_port_packed(port, 1, palette.link(s.get('speed'), s.get('up', False), stale))
+            else:
+                r, g, b = palette.link_rgb(s.get('speed'), s.get('up', False), stale)
+                strip.set_port_led(port, 1, (int(r*lvl), int(g*lvl), int(b*lvl)))
+
+def utilization_levels(state, port_count, floor=0.1):
+    """{port: link LED level} from the poller's traffic rates (ports without rates sit at floor)."""
+    out = {}
+    for port in range(1, port_count+1):
+        rates = (state.get(port) or {}).get('rates') or {}
+        out[port] = util_level(rates.get('util'), floor)
+    return out
+
+def render_frame(strip, palette, frame_comp, fx, state, cfg_local, state_version=None):
+    """Draw one frame into the strip framebuffer from the composited effects `fx` (show() not called)."""
+    port_count  = cfg_local['device']['ports']['count']
+    leds_pp     = cfg_local['device'].get('leds_per_port', 2)
+
+    # Base frame: VLAN (slot0) solid, Link (slot1) scaled by the pulse layer
+    # or, with led.link_mode = "utilization", by each port's traffic
+    if fx.base:
+        palette.update(cfg_local.get('vlan_colors', {}), cfg_local.get('link_colors', {}),
+                       getattr(cfg_local, 'generation', None))
+        palette.begin_frame(fx.link_factor)
+        led_cfg = cfg_local.get('led') or {}
+        levels = None
+        if led_cfg.get('link_mode') == 'utilization':
+            levels = utilization_levels(state, port_count, float(led_cfg.get('utilization_floor', 0.1)))
+        if frame_comp is not None:
+            frame_comp.render(state, palette, port_count, leds_pp, fx.link_factor, fx.overrides, levels,
+                              state_version)
+        else:
+            render_ports(strip, palette, state, port_count, leds_pp, fx.overrides, levels)
+
+    # Layers above the base (identify, rainbow, ...) in priority order
+    for effect, level in fx.painters:
+        effect.paint(strip, level, leds_pp)
@@ -293,7 +293,7 @@ class SmallDisplay:
             try:
                 from app_context import AppContext
                 ctx = AppContext.current()
-                cfg = ctx.get_cfg_snapshot()
+                cfg = ctx.get_cfg()
                 st = ctx.get_state_snapshot()
                 temps = ctx.get_temp_snapshot() or {}
             except Exception:
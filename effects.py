@@ -0,0 +1,302 @@
+import math, threading, time
+from array import array
+from led_driver import WHEEL_RGB
+
+# ---- Precomputed waveform tables (one period, 0..1) ----
+WAVE_N = 1024
+
+def _table(fn):
+    return array('d', (fn(i / WAVE_N) for i in range(WAVE_N)))
+
+WAVES = {
+    'sine':     _table(lambda t: 0.5 * (1.0 - math.cos(2 * math.pi * t))),  # 0→1→0, starts low
+    'triangle': _table(lambda t: 1.0 - abs(2.0 * t - 1.0)),
+    'saw':      _table(lambda t: t),
+}
+
+def wave(shape, phase):
+    """Waveform value for phase in [0,1) from the lookup table (unknown shapes fall back to sine)."""
+    tbl = WAVES.get(shape) or WAVES['sine']
+    return tbl[int(phase * WAVE_N) % WAVE_N]
+
+def _clamp(x, lo=0.0, hi=1.0):
+    return hi if x>hi else lo if x<lo else x
+
+def _parse_color(c):
+    """'#rrggbb' or an (r, g, b) sequence -> (r, g, b) ints 0..255; ValueError otherwise."""
+    if isinstance(c, str):
+        h = c.strip().lstrip('#')
+        if len(h) != 6:
+            raise ValueError(f"bad color: {c!r}")
+        return (int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16))
+    try:
+        rgb = tuple(int(v) for v in c)
+    except TypeError:
+        raise ValueError(f"bad color: {c!r}")
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise ValueError(f"bad color: {c!r}")
+    return rgb
+
+def _float_params(params, *names):
+    """Convert the given params to float in place (ValueError/TypeError on bad input)."""
+    for n in names:
+        if params.get(n) is not None:
+            params[n] = float(params[n])
+
+def _scale_rgb(rgb, f):
+    r,g,b = rgb
+    return (int(r*f), int(g*f), int(b*f))
+
+WHITE = (255, 255, 255)
+
+# ---- Effect registry ----
+EFFECTS = {}
+
+def register_effect(cls):
+    """Class decorator: make an Effect subclass startable by its `name`."""
+    EFFECTS[cls.name] = cls
+    return cls
+
+class Effect:
+    """
+    One layer of the LED frame. level() is evaluated once per frame; the layer
+    then either modulates the link pulse ('modulate'), paints one colour over
+    its ports ('color') or paints per pixel ('pixels').
+    ports=None means the whole strip.
+    `start`/`duration` are local monotonic time so a clock sync can't stretch or cut a
+    timed layer; `phase0` is the animation-clock origin its waveform is measured from.
+    """
+    name = None
+    kind = 'color'
+    default_priority = 0
+
+    def __init__(self, ports=None, priority=None, duration=None, start=None, phase0=None, **params):
+        self.ports = None if ports is None else frozenset(int(p) for p in ports)
+        self.priority = self.default_priority if priority is None else int(priority)
+        self.duration = None if duration is None else max(0.0, float(duration))
+        self.start = time.monotonic() if start is None else float(start)
+        self.phase0 = self.start if phase0 is None else float(phase0)
+        if params.get('color') is not None:
+            params['color'] = _parse_color(params['color'])
+        self.params = params
+
+    def expired(self, mono):
+        return self.duration is not None and mono - self.start >= self.duration
+
+    def animates(self, cfg):
+        return True
+
+    def level(self, now, cfg):
+        return 1.0
+
+    def color(self, level):
+        return _scale_rgb(self.params.get('color', WHITE), level)
+
+    def paint(self, strip, level, leds_pp):
+        """Draw this layer straight into the strip framebuffer (used above the base frame)."""
+        rgb = self.color(level)
+        if self.ports is None:
+            strip.fill(rgb)
+            return
+        packed = strip.pack(rgb)
+        for port in self.ports:
+            strip.set_port_packed(port, 0, packed)
+            if leds_pp >= 2:
+                strip.set_port_packed(port, 1, packed)
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'ports': None if self.ports is None else sorted(self.ports),
+            'start': self.start,
+            'duration': self.duration,
+        }
+
+def _pulse_params(params, cfg):
+    p = dict((cfg or {}).get('pulse') or {})
+    p.update(params)
+    period = max(0.5, float(p.get('period_ms', 2000)) / 1000.0)
+    return period, float(p.get('min', 0.15)), float(p.get('max', 1.0)), (p.get('shape', 'sine') or 'sine').lower()
+
+@register_effect
+class PulseEffect(Effect):
+    """Breathing factor for the link LEDs; phase follows the (shared) animation clock so all pulses line up."""
+    name = 'pulse'
+    kind = 'modulate'
+
+    def __init__(self, ports=None, priority=None, duration=None, start=None, **params):
+        _float_params(params, 'period_ms', 'min', 'max')
+        if params.get('shape') is not None:
+            params['shape'] = str(params['shape'])
+        super().__init__(ports, priority, duration, start, **params)
+
+    def animates(self, cfg):
+        _, lo, hi, _ = _pulse_params(self.params, cfg)
+        return lo != hi
+
+    def level(self, now, cfg):
+        period, lo, hi, shape = _pulse_params(self.params, cfg)
+        f = lo + (hi - lo) * wave(shape, (now % period) / period)
+        return _clamp(f)
+
+@register_effect
+class IdentifyEffect(PulseEffect):
+    """Identify: pulse the whole strip white using the configured pulse curve."""
+    name = 'identify'
+    kind = 'color'
+    default_priority = 100
+
+    def animates(self, cfg):
+        return True
+
+@register_effect
+class FlashEffect(Effect):
+    """Port flash: `pulses` white swells of `period` seconds each."""
+    name = 'flash'
+    default_priority = 50
+
+    def __init__(self, ports=None, priority=None, duration=None, start=None, **params):
+        period = max(0.15, float(params.get('period', 0.6)))
+        pulses = max(1, int(params.get('pulses', 3)))
+        params.update(period=period, pulses=pulses)
+        if duration is None:
+            duration = period * pulses
+        super().__init__(ports, priority, duration, start, **params)
+
+    def level(self, now, cfg):
+        period = self.params['period']
+        return wave('sine', ((now - self.phase0) % period) / period)
+
+@register_effect
+class BlinkEffect(Effect):
+    """Hard on/off blink using the `blink` config section (period_ms, duty)."""
+    name = 'blink'
+    default_priority = 20
+
+    def __init__(self, ports=None, priority=None, duration=None, start=None, **params):
+        _float_params(params, 'period_ms', 'duty')
+        super().__init__(ports, priority, duration, start, **params)
+
+    def level(self, now, cfg):
+        b = dict((cfg or {}).get('blink') or {})
+        b.update(self.params)
+        period = max(0.05, float(b.get('period_ms', 1000)) / 1000.0)
+        duty = _clamp(float(b.get('duty', 0.5)))
+        return 1.0 if wave('saw', ((now - self.phase0) % period) / period) < duty else 0.0
+
+@register_effect
+class RainbowEffect(Effect):
+    """Colour wheel scrolling along the strip (boot animation)."""
+    name = 'rainbow'
+    kind = 'pixels'
+    default_priority = 80
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = None  # (strip, base wheel positions, packed wheel)
+
+    def level(self, now, cfg):
+        # wheel offset: 6 steps every 20 ms, as a 0..1 phase
+        return (((now - self.phase0) / 0.02 * 6) % 256) / 256.0
+
+    def paint(self, strip, level, leds_pp):
+        if self._cache is None or self._cache[0] is not strip:
+            total = strip.total
+            base = [(i * 256 // max(1, total - 1)) & 255 for i in range(total)]
+            self._cache = (strip, base, [strip.pack(c) for c in WHEEL_RGB])
+        _, base, wheel = self._cache
+        off = int(level * 256)
+        frame = strip.frame_buffer()
+        if self.ports is None:
+            for i, pos in enumerate(base):
+                frame[i] = wheel[(pos + off) & 255]
+            return
+        lpp = strip.leds_per_port
+        for port in self.ports:
+            for i in range((port - 1) * lpp, min(port * lpp, strip.total)):
+                if i >= 0:
+                    frame[i] = wheel[(base[i] + off) & 255]
+
+class FrameFx:
+    """Result of compositing the effect layers for one frame."""
+    __slots__ = ('link_factor', 'base', 'overrides', 'painters', 'animating')
+
+    def __init__(self):
+        self.link_factor = 1.0
+        self.base = True          # draw the normal VLAN/link frame underneath
+        self.overrides = {}       # {port: rgb} uniform overrides the base renderer applies
+        self.painters = []        # [(effect, level)] drawn after the base frame, in order
+        self.animating = False
+
+# Key of the link-pulse layer every frame is built on; not replaceable through the API
+BASE_KEY = 'pulse'
+
+class EffectEngine:
+    """
+    Holds the active effect layers (keyed, so re-starting replaces) and composites them per frame.
+    `clock` gives animation time (phase origins and evaluate()'s `now`); synced Pis share it.
+    Expiry runs on time.monotonic(), so timed layers last their duration even when `clock` jumps.
+    """
+    def __init__(self, clock=time.time):
+        self._lock = threading.Lock()
+        self._layers = {}
+        self.clock = clock
+        self.start('pulse', key=BASE_KEY)
+
+    def start(self, name, key=None, **kwargs):
+        cls = EFFECTS.get(name)
+        if cls is None:
+            raise KeyError(f"unknown effect: {name}")
+        if kwargs.get('phase0') is None:
+            kwargs['phase0'] = self.clock()
+        fx = cls(**kwargs)
+        with self._lock:
+            self._layers[key or name] = fx
+        return fx
+
+    def stop(self, key):
+        with self._lock:
+            return self._layers.pop(key, None) is not None
+
+    def active(self, key):
+        with self._lock:
+            return key in self._layers
+
+    def describe(self):
+        with self._lock:
+            return {k: fx.describe() for k, fx in self._layers.items()}
+
+    def evaluate(self, now, cfg, leds_pp=2, mono=None):
+        if mono is None:
+            mono = time.monotonic()
+        with self._lock:
+            expired = [k for k, fx in self._layers.items() if fx.expired(mono)]
+            for k in expired:
+                self._layers.pop(k, None)
+            layers = sorted(self._layers.values(), key=lambda fx: fx.priority)
+
+        # in utilization mode the link LEDs follow traffic, so the pulse is never drawn
+        pulse_shown = leds_pp >= 2 and ((cfg or {}).get('led') or {}).get('link_mode') != 'utilization'
+        out = FrameFx()
+        for fx in layers:
+            lvl = fx.level(now, cfg)
+            if fx.kind == 'modulate':
+                out.link_factor = lvl
+                if pulse_shown and fx.animates(cfg):
+                    out.animating = True
+                continue
+            if fx.animates(cfg):
+                out.animating = True
+            if fx.ports is None:
+                # whole-strip layer hides everything below it
+                out.base = False
+                out.overrides = {}
+                out.painters = [(fx, lvl)]
+            elif fx.kind == 'color' and not out.painters:
+                rgb = fx.color(lvl)
+                for port in fx.ports:
+                    out.overrides[port] = rgb
+            else:
+                out.painters.append((fx, lvl))
+        return out
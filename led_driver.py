@@ -1,3 +1,6 @@
+import atexit, struct, threading, time
+from array import array
+
 try:
     from rpi_ws281x import PixelStrip, Color
     import rpi_ws281x as ws
@@ -21,6 +24,10 @@ def rgb_to_rgbw(r:int,g:int,b:int):
     w = min(r, g, b)
     return (r - w, g - w, b - w, w)
 
+def pack_color(r:int, g:int, b:int, w:int=0):
+    """Pack a colour the same way rpi_ws281x.Color does (0xWWRRGGBB)."""
+    return ((int(w) & 0xFF) << 24) | ((int(r) & 0xFF) << 16) | ((int(g) & 0xFF) << 8) | (int(b) & 0xFF)
+
 def _strip_type(type_name:str, order:str):
     if not _HAS_WS:
         return None
@@ -36,6 +43,114 @@ def _strip_type(type_name:str, order:str):
     const = f"WS2811_STRIP_{o}"
     return getattr(ws, const, ws.WS2811_STRIP_GRB)
 
+def _wheel(pos:int):
+    # standard RGB wheel
+    if pos < 85:    return (pos*3, 255 - pos*3, 0)
+    if pos < 170:   pos -= 85;  return (255 - pos*3, 0, pos*3)
+    pos -= 170;     return (0, pos*3, 255 - pos*3)
+
+# 256-entry colour wheel, shared by rainbow_cycle and the rainbow effect
+WHEEL_RGB = tuple(_wheel(p) for p in range(256))
+
+LINK_SPEED_BUCKETS = (10, 100, 1000, 2500, 10000)
+
+def _safe_rgb(hx, default):
+    try:
+        return hex_to_rgb(str(hx))
+    except Exception:
+        return hex_to_rgb(default)
+
+class ColorPalette:
+    """
+    VLAN/link colours compiled once from the config into integer-keyed maps of
+    packed strip values. update() only rebuilds when the colour maps changed.
+    """
+    def __init__(self, pack):
+        self._pack = pack
+        self._src = None
+        self._src_gen = None
+        self._vlan_rgb = {}
+        self._vlan_packed = {}
+        self._vlan_default = pack((16,16,16))
+        self._link_rgb = {}
+        self._link_default_rgb = (0,0,0)
+        self._down_rgb = (0,0,0)
+        self._stale_rgb = (128,0,128)
+        self._link_f = None
+        self._link_frame = {}
+        self._link_frame_default = 0
+        self._down_frame = 0
+        self._stale_frame = 0
+        self.generation = 0
+
+    def update(self, vlan_colors, link_colors, generation=None):
+        """
+        Recompile if the colour maps differ from the last build. Returns True if rebuilt.
+        With a config `generation`, an unchanged generation skips even the comparison.
+        """
+        if generation is not None and generation == self._src_gen:
+            return False
+        self._src_gen = generation
+        vlan_colors = vlan_colors or {}
+        link_colors = link_colors or {}
+        if self._src is not None and self._src == (vlan_colors, link_colors):
+            return False
+        self._src = (dict(vlan_colors), dict(link_colors))
+
+        self._vlan_rgb = {}
+        for k, hx in vlan_colors.items():
+            try:
+                self._vlan_rgb[int(k)] = _safe_rgb(hx, '#101010')
+            except (TypeError, ValueError):
+                continue
+        self._vlan_packed = {k: self._pack(rgb) for k, rgb in self._vlan_rgb.items()}
+
+        self._link_rgb = {b: _safe_rgb(link_colors.get(str(b), '#00C853'), '#00C853') for b in LINK_SPEED_BUCKETS}
+        self._link_default_rgb = self._link_rgb[1000]
+        self._down_rgb = _safe_rgb(link_colors.get('down', '#000000'), '#000000')
+        self._stale_rgb = _safe_rgb(link_colors.get('stale', '#800080'), '#800080')
+        self._link_f = None
+        self.generation += 1
+        return True
+
+    def vlan_rgb(self, vlan):
+        if vlan is None: return (16,16,16)
+        return self._vlan_rgb.get(vlan, (16,16,16))
+
+    def vlan(self, vlan):
+        """Packed VLAN colour (slot 0)."""
+        if vlan is None: return self._vlan_default
+        return self._vlan_packed.get(vlan, self._vlan_default)
+
+    def link_rgb(self, speed_mbps, up, stale=False):
+        if stale:
+            return self._stale_rgb
+        if not up or not speed_mbps:
+            return self._down_rgb
+        return self._link_rgb.get(speed_mbps, self._link_default_rgb)
+
+    def begin_frame(self, f):
+        """Pre-scale and pack the link colours by the frame's pulse factor."""
+        if f == self._link_f:
+            return
+        pack = self._pack
+        def scaled(rgb):
+            r,g,b = rgb
+            return pack((int(r*f), int(g*f), int(b*f)))
+        self._link_frame = {b: scaled(rgb) for b, rgb in self._link_rgb.items()}
+        self._link_frame_default = self._link_frame[1000]
+        self._down_frame = scaled(self._down_rgb)
+        self._stale_frame = scaled(self._stale_rgb)
+        self._link_f = f
+
+    def link(self, speed_mbps, up, stale=False):
+        """Packed link colour (slot 1) scaled by the factor given to begin_frame()."""
+        if stale:
+            return self._stale_frame
+        if not up or not speed_mbps:
+            return self._down_frame
+        return self._link_frame.get(speed_mbps, self._link_frame_default)
+
 class _MockStrip:
     def __init__(self, count, pin, brightness=64, **_):
         self._count = count
@@ -43,44 +158,304 @@ class _MockStrip:
         self._brightness = brightness
     def numPixels(self): return self._count
     def setPixelColor(self, i, color):
-        pass
+        self._pixels[i] = ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF, (color >> 24) & 0xFF)
     def show(self): pass
     def begin(self): pass
     def setBrightness(self, b): self._brightness = b
 
+CAPTURE_MAGIC = b"ELFR"
+CAPTURE_VERSION = 1
+_CAPTURE_HDR = struct.Struct("<4sBBHII")    # magic, version, flags(bit0=rgbw), reserved, pixels, frames
+_CAPTURE_FRAME = struct.Struct("<dfI")      # timestamp, render cost (s), changed pixels
+
+class RecordingStrip:
+    """
+    Headless backend that keeps the last `capacity` committed frames (packed pixels,
+    timestamp, render cost, changed-pixel count) in a preallocated ring buffer.
+    """
+    def __init__(self, count, pin=None, brightness=255, capacity=600, **_):
+        self._count = int(count)
+        self._cap = max(1, int(capacity))
+        self._live = array('I', [0]) * self._count
+        self._ring = array('I', [0]) * (self._count * self._cap)
+        self._ts = array('d', [0.0]) * self._cap
+        self._cost = array('d', [0.0]) * self._cap
+        self._changed = array('I', [0]) * self._cap
+        self._head = 0
+        self._held = 0
+        self._committed = 0
+        self._pending = 0
+        self._frame_cost = 0.0
+        self.rgbw = False
+    def numPixels(self): return self._count
+    def setPixelColor(self, i, color):
+        self._live[i] = color
+        self._pending += 1
+    def begin(self): pass
+    def setBrightness(self, b): pass
+    def set_frame_cost(self, seconds):
+        self._frame_cost = float(seconds)
+    def show(self):
+        h, n = self._head, self._count
+        self._ring[h * n:(h + 1) * n] = self._live
+        self._ts[h] = time.monotonic()
+        self._cost[h] = self._frame_cost
+        self._changed[h] = self._pending
+        self._pending = 0
+        self._head = (h + 1) % self._cap
+        self._held = min(self._cap, self._held + 1)
+        self._committed += 1
+
+    def frames(self):
+        """Held frames oldest first: (timestamp, cost_s, changed, array of packed pixels)."""
+        n = self._count
+        for h in self._held_slots():
+            yield self._ts[h], self._cost[h], self._changed[h], self._ring[h * n:(h + 1) * n]
+
+    def _held_slots(self):
+        first = (self._head - self._held) % self._cap
+        return [(first + k) % self._cap for k in range(self._held)]
+
+    def get_stats(self):
+        # per-frame fields only; the pixel ring is never touched
+        slots = self._held_slots()
+        held = len(slots)
+        out = {"capacity": self._cap, "held": held, "committed": self._committed}
+        if held >= 2 and self._ts[slots[-1]] > self._ts[slots[0]]:
+            out["achieved_fps"] = round((held - 1) / (self._ts[slots[-1]] - self._ts[slots[0]]), 2)
+        if held:
+            costs = sorted(self._cost[h] for h in slots)
+            changed = [self._changed[h] for h in slots]
+            out["cost_ms_mean"] = round(1000.0 * sum(costs) / len(costs), 3)
+            out["cost_ms_p99"] = round(1000.0 * costs[min(len(costs) - 1, int(0.99 * len(costs)))], 3)
+            out["cost_ms_max"] = round(1000.0 * costs[-1], 3)
+            out["changed_mean"] = round(sum(changed) / len(changed), 2)
+            out["changed_max"] = max(changed)
+        return out
+
+    def dump(self, path):
+        """Write held frames as a compact little-endian capture (see load_capture)."""
+        held = list(self.frames())
+        with open(path, "wb") as f:
+            f.write(_CAPTURE_HDR.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 1 if self.rgbw else 0, 0, self._count, len(held)))
+            for ts, cost, changed, px in held:
+                f.write(_CAPTURE_FRAME.pack(ts, cost, changed))
+                f.write(struct.pack(f"<{len(px)}I", *px))
+        return len(held)
+
+def load_capture(path):
+    """Read a capture written by RecordingStrip.dump()."""
+    with open(path, "rb") as f:
+        magic, ver, flags, _, pixels, count = _CAPTURE_HDR.unpack(f.read(_CAPTURE_HDR.size))
+        if magic != CAPTURE_MAGIC or ver != CAPTURE_VERSION:
+            raise ValueError("not an Etherlight frame capture")
+        frames = []
+        for _ in range(count):
+            ts, cost, changed = _CAPTURE_FRAME.unpack(f.read(_CAPTURE_FRAME.size))
+            px = struct.unpack(f"<{pixels}I", f.read(4 * pixels))
+            frames.append((ts, cost, changed, px))
+    return {"pixels": pixels, "rgbw": bool(flags & 1), "frames": frames}
+
+# GPIO -> PWM channel of the ws281x driver (channel 1 is the second, independent chain)
+_PWM_CHANNEL = {12: 0, 18: 0, 40: 0, 52: 0, 13: 1, 19: 1, 41: 1, 45: 1, 53: 1}
+
+def _channel_layout(channels, port_count, leds_per_port):
+    """
+    led.channels ([{pin, ports: [first, last]}]) -> [(pin, first_pixel, pixel_count)] for up to two chains.
+    The ranges must cover ports 1..port_count exactly once; anything else falls back to a single chain.
+    """
+    out = []
+    for ch in channels or []:
+        try:
+            pin = int(ch.get('pin'))
+            first, last = ch.get('ports') or (1, port_count)
+            first = int(first); last = int(last)
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if not 1 <= first <= last <= port_count:
+            print(f"[led] channel GPIO{pin} ports {first}-{last} are outside 1-{port_count}; using a single chain")
+            return out[:1]
+        out.append((pin, (first - 1) * leds_per_port, (last - first + 1) * leds_per_port))
+    if len(out) > 2:
+        print("[led] only two ws281x channels exist; ignoring extra channel entries")
+        out = out[:2]
+    if len(out) == 2 and _PWM_CHANNEL.get(out[0][0], 0) == _PWM_CHANNEL.get(out[1][0], 0):
+        print(f"[led] GPIO{out[0][0]} and GPIO{out[1][0]} share a PWM channel; using a single chain")
+        out = out[:1]
+    if len(out) == 2:
+        a, b = sorted(out, key=lambda c: c[1])
+        if a[1] != 0 or a[1] + a[2] != b[1] or b[1] + b[2] != port_count * leds_per_port:
+            # overlapping ranges would drive pixels twice, gaps would leave ports dark
+            print("[led] channel port ranges overlap or leave ports unmapped; using a single chain")
+            out = out[:1]
+    return out
+
+class _ChannelRouter:
+    """Maps the contiguous logical pixel index onto (channel, index in that chain)."""
+    def __init__(self, total, layout):
+        self._count = total
+        self._route = [(-1, -1)] * total
+        for ch, (_, first, count) in enumerate(layout):
+            for k in range(count):
+                if first + k < total:
+                    self._route[first + k] = (ch, k)
+    def numPixels(self): return self._count
+    def setPixelColor(self, i, color):
+        ch, k = self._route[i]
+        if ch >= 0:
+            self._set(ch, k, color)
+    def begin(self): pass
+    def setBrightness(self, b): pass
+
+class _MockDualStrip(_ChannelRouter):
+    """Mock of two chains; each chain is a _MockStrip so tests can inspect them separately."""
+    def __init__(self, total, layout, brightness=255):
+        super().__init__(total, layout)
+        self.channels = [_MockStrip(count, pin, brightness=brightness) for pin, _, count in layout]
+    def _set(self, ch, k, color):
+        self.channels[ch].setPixelColor(k, color)
+    def show(self):
+        for c in self.channels:
+            c.show()
+
+class _WsDualStrip(_ChannelRouter):
+    """Both PWM channels on one ws2811_t, so a single render() clocks out both chains in parallel."""
+    def __init__(self, total, layout, strip_type, freq_hz=800000, dma=10):
+        super().__init__(total, layout)
+        import _rpi_ws281x as ll
+        self._ll = ll
+        self._leds = ll.new_ws2811_t()
+        for chnum in range(2):
+            chan = ll.ws2811_channel_get(self._leds, chnum)
+            ll.ws2811_channel_t_gamma_set(chan, list(range(256)))
+            ll.ws2811_channel_t_count_set(chan, 0)
+            ll.ws2811_channel_t_gpionum_set(chan, 0)
+            ll.ws2811_channel_t_invert_set(chan, 0)
+            ll.ws2811_channel_t_brightness_set(chan, 0)
+        self._chans = []
+        for pin, _, count in layout:
+            chan = ll.ws2811_channel_get(self._leds, _PWM_CHANNEL.get(pin, 0))
+            ll.ws2811_channel_t_count_set(chan, count)
+            ll.ws2811_channel_t_gpionum_set(chan, pin)
+            ll.ws2811_channel_t_brightness_set(chan, 255)
+            ll.ws2811_channel_t_strip_type_set(chan, strip_type)
+            self._chans.append(chan)
+        ll.ws2811_t_freq_set(self._leds, freq_hz)
+        ll.ws2811_t_dmanum_set(self._leds, dma)
+    def begin(self):
+        resp = self._ll.ws2811_init(self._leds)
+        if resp != 0:
+            raise RuntimeError(f"ws2811_init failed with code {resp}")
+    def close(self):
+        """Stop DMA/PWM and free the driver struct. LedStrip calls this at exit under its show lock."""
+        if self._leds is not None:
+            self._ll.ws2811_fini(self._leds)
+            self._ll.delete_ws2811_t(self._leds)
+            self._leds = None
+            self._chans = []
+    def _set(self, ch, k, color):
+        if self._leds is None:
+            return      # released
+        self._ll.ws2811_led_set(self._chans[ch], k, color)
+    def show(self):
+        if self._leds is None:
+            return      # released
+        resp = self._ll.ws2811_render(self._leds)
+        if resp != 0:
+            raise RuntimeError(f"ws2811_render failed with code {resp}")
+
 class LedStrip:
-    def __init__(self, port_count, leds_per_port, pin=18, brightness=64, strip_type='ws2812b', color_order='GRB'):
+    def __init__(self, port_count, leds_per_port, pin=18, brightness=64, strip_type='ws2812b', color_order='GRB',
+                 gamma=1.0, white_balance=None, channels=None, backend=None, record_frames=600,
+                 defer_begin=False):
         self.port_count   = int(port_count)
         self.leds_per_port= max(1, int(leds_per_port))
         self.total        = self.port_count * self.leds_per_port
         self._order       = (color_order or "GRB").upper()
         self._is_rgbw     = ("W" in self._order) or (strip_type and "w" in str(strip_type).lower())
 
-        if _HAS_WS:
-            st = _strip_type(strip_type, color_order)
-            self.strip = PixelStrip(self.total, pin, brightness=brightness, strip_type=st)
-            self.strip.begin()
-            self.strip.setBrightness(brightness)
+        # Optional split across both PWM channels; otherwise one chain on `pin`
+        layout = _channel_layout(channels, self.port_count, self.leds_per_port)
+        if len(layout) < 2:
+            layout = [(layout[0][0] if layout else int(pin), 0, self.total)]
+        self.channel_layout = layout
+
+        # Brightness is applied through the output LUTs, so the hardware runs at full scale.
+        # backend: None/'auto' (ws281x if available), 'mock', or 'record' (RecordingStrip).
+        backend = (backend or 'auto').lower()
+        if backend == 'record':
+            self.strip = RecordingStrip(self.total, capacity=record_frames)
+            self.strip.rgbw = bool(self._is_rgbw)
+        elif backend == 'mock' or not _HAS_WS:
+            self.strip = _MockDualStrip(self.total, layout) if len(layout) == 2 else _MockStrip(self.total, layout[0][0])
+        elif len(layout) == 2:
+            self.strip = _WsDualStrip(self.total, layout, _strip_type(strip_type, color_order))
         else:
-            self.strip = _MockStrip(self.total, pin, brightness=brightness)
+            st = _strip_type(strip_type, color_order)
+            self.strip = PixelStrip(self.total, layout[0][0], brightness=255, strip_type=st)
+        self._begun = False
+
+        # Framebuffers of packed colours: _frame is what the renderer is building,
+        # _committed is what was last pushed to the strip. show() only pushes the diff,
+        # mapping each channel through the gamma/brightness/white-balance LUTs on the way out.
+        self._frame = array('I', [0]) * self.total
+        self._committed = array('I', [0]) * self.total
+        self._force_full = True
+        self._show_lock = threading.Lock()
+        self._stats = {
+            "frames_pushed": 0,
+            "frames_skipped": 0,
+            "pixels_pushed": 0,
+            "pixels_skipped": 0,
+        }
+        self._frame_t0 = None
+        self._lut_key = None
+        self.configure(brightness=brightness, gamma=gamma, white_balance=white_balance)
+        if not defer_begin:
+            self.begin()
+
+    def configure(self, brightness=None, gamma=None, white_balance=None):
+        """
+        (Re)build the per-channel output tables from brightness (0..255), gamma and
+        white_balance ({'r','g','b','w'} gains). Cheap no-op if nothing changed; never re-inits the strip.
+        """
+        key = self._lut_key or (64, 1.0, (1.0, 1.0, 1.0, 1.0))
+        b = key[0] if brightness is None else max(0, min(255, int(brightness)))
+        g = key[1] if gamma is None else max(0.1, float(gamma))
+        wb = key[2]
+        if white_balance is not None:
+            wb = tuple(max(0.0, min(1.0, float((white_balance or {}).get(ch, 1.0)))) for ch in "rgbw")
+        new_key = (b, g, wb)
+        if new_key == self._lut_key:
+            return False
+        luts = []
+        for shift, gain in zip((16, 8, 0, 24), wb):
+            # gamma + channel gain, then brightness the same way ws281x scales it ((c*(b+1))>>8)
+            luts.append(array('I', (
+                (int(255.0 * (c / 255.0) ** g * gain * (b + 1) / 256.0) & 0xFF) << shift
+                for c in range(256))))
+        with self._show_lock:
+            self._lut_r, self._lut_g, self._lut_b, self._lut_w = luts
+            self._lut_key = new_key
+            self._force_full = True
+        return True
+
+    def pack(self, rgba):
+        """Packed strip value for (r,g,b) or (r,g,b,w), with RGBW white extraction."""
+        if self._is_rgbw:
+            if len(rgba) == 3:
+                r,g,b = rgba
+                r,g,b,w = rgb_to_rgbw(int(r),int(g),int(b))
+            else:
+                r,g,b,w = rgba
+            return pack_color(r, g, b, w)
+        r,g,b = (tuple(rgba) + (0,))[:3]
+        return pack_color(r, g, b)
 
     def _set_color(self, idx:int, rgba):
         """rgba: (r,g,b) or (r,g,b,w)"""
         if idx < 0 or idx >= self.total: return
-        if _HAS_WS:
-            if self._is_rgbw:
-                if len(rgba) == 3:
-                    r,g,b = rgba
-                    r,g,b,w = rgb_to_rgbw(int(r),int(g),int(b))
-                else:
-                    r,g,b,w = rgba
-                self.strip.setPixelColor(idx, Color(int(r),int(g),int(b),int(w)))
-            else:
-                r,g,b = (rgba + (0,))[:3]
-                self.strip.setPixelColor(idx, Color(int(r),int(g),int(b)))
-        else:
-            # mock: do nothing visible
-            pass
+        self._frame[idx] = self.pack(rgba)
 
     # Back-compat with existing app.py identify() which calls _set_rgb(...)
     def _set_rgb(self, idx:int, rgb):
@@ -91,30 +466,124 @@ class LedStrip:
         i = base + min(max(led_slot,0), self.leds_per_port-1)
         self._set_color(i, rgb_tuple)
 
+    @property
+    def is_rgbw(self):
+        return bool(self._is_rgbw)
+
+    def frame_buffer(self):
+        """The writable packed-colour frame (array('I')) for bulk writers; latched by show()."""
+        return self._frame
+
+    def fill(self, rgba):
+        packed = self.pack(rgba)
+        self._frame[:] = array('I', [packed]) * self.total
+
+    def set_port_packed(self, port_idx:int, led_slot:int, packed:int):
+        """Like set_port_led() but takes a value already packed by pack()."""
+        i = (port_idx - 1) * self.leds_per_port + min(max(led_slot,0), self.leds_per_port-1)
+        if 0 <= i < self.total:
+            self._frame[i] = packed
+
     def set_all_black(self):
         for i in range(self.total):
             self._set_color(i, (0,0,0,0))
         self.show()
 
-    def show(self): self.strip.show()
+    def show(self):
+        """Push changed pixels and latch them; skip the strip entirely if nothing changed."""
+        with self._show_lock:
+            frame, committed = self._frame, self._committed
+            st = self._stats
+            if not self._begun:
+                return False
+            if not self._force_full and frame == committed:
+                st["frames_skipped"] += 1
+                st["pixels_skipped"] += self.total
+                return False
+            pushed = 0
+            set_px = self.strip.setPixelColor
+            lr, lg, lb, lw = self._lut_r, self._lut_g, self._lut_b, self._lut_w
+            for i in range(self.total):
+                c = frame[i]
+                if self._force_full or c != committed[i]:
+                    set_px(i, lw[c >> 24] | lr[(c >> 16) & 0xFF] | lg[(c >> 8) & 0xFF] | lb[c & 0xFF])
+                    committed[i] = c
+                    pushed += 1
+            self._force_full = False
+            note_cost = getattr(self.strip, 'set_frame_cost', None)
+            if note_cost is not None:
+                t0 = self._frame_t0
+                note_cost(time.perf_counter() - t0 if t0 is not None else 0.0)
+                self._frame_t0 = None
+            self.strip.show()
+            st["frames_pushed"] += 1
+            st["pixels_pushed"] += pushed
+            st["pixels_skipped"] += self.total - pushed
+            return True
+
+    def begin(self):
+        """Hardware init (DMA/PWM setup). Deferred with defer_begin=True so it can run off the boot path."""
+        if self._begun:
+            return
+        self.strip.begin()
+        self.strip.setBrightness(255)
+        with self._show_lock:
+            self._begun = True
+            self._force_full = True
+        if hasattr(self.strip, 'close'):
+            # the render thread is a daemon and may still be in show() when atexit runs.
+            # atexit only runs on a normal exit; app.py turns systemd's SIGTERM into one.
+            atexit.register(self.close)
+
+    def close(self):
+        """Release the hardware driver; later show() calls are no-ops."""
+        with self._show_lock:
+            self._begun = False
+            close = getattr(self.strip, 'close', None)
+            if close is not None:
+                close()
+
+    @property
+    def ready(self):
+        return self._begun
+
+    def begin_frame(self):
+        """Mark the start of rendering a frame (lets recording backends attribute render cost)."""
+        self._frame_t0 = time.perf_counter()
+
+    def invalidate(self):
+        """Force the next show() to push every pixel (e.g. after external writes)."""
+        with self._show_lock:
+            self._force_full = True
+
+    def get_stats(self):
+        with self._show_lock:
+            out = dict(self._stats)
+            if isinstance(self.strip, RecordingStrip):
+                out["recorder"] = self.strip.get_stats()
+            b, g, wb = self._lut_key
+        out["pixels"] = self.total
+        out["brightness"] = b
+        out["gamma"] = g
+        out["white_balance"] = dict(zip("rgbw", wb))
+        # WS281x wire time: ~1.25 us per bit plus the latch; chains run in parallel
+        bits = 32 if self._is_rgbw else 24
+        out["channels"] = [{"pin": p, "first_pixel": f, "pixels": n} for p, f, n in self.channel_layout]
+        out["wire_us"] = round(max(n for _, _, n in self.channel_layout) * bits * 1.25 + 80, 1)
+        return out
 
     def rainbow_cycle(self, duration_sec=1.5):
         if self.total <= 0: return
         steps = max(1, int(duration_sec / 0.02))
+        wheel = [self.pack(c) for c in WHEEL_RGB]
+        base = [(i * 256 // max(1,self.total-1)) & 255 for i in range(self.total)]
+        frame = self._frame
         for t in range(steps):
-            for i in range(self.total):
-                pos = (i * 256 // max(1,self.total-1) + (t*6)) & 255
-                r,g,b = self._wheel(pos)
-                if self._is_rgbw:
-                    r,g,b,w = rgb_to_rgbw(r,g,b)
-                    self._set_color(i, (r,g,b,w))
-                else:
-                    self._set_color(i, (r,g,b))
+            off = t*6
+            for i, pos in enumerate(base):
+                frame[i] = wheel[(pos + off) & 255]
             self.show()
 
     @staticmethod
     def _wheel(pos:int):
-        # standard RGB wheel
-        if pos < 85:    return (pos*3, 255 - pos*3, 0)
-        if pos < 170:   pos -= 85;  return (255 - pos*3, 0, pos*3)
-        pos -= 170;     return (0, pos*3, 255 - pos*3)
+        return WHEEL_RGB[pos & 255]
@@ -0,0 +1,117 @@
+import threading, time
+from collections import deque
+
+class RenderScheduler:
+    """
+    Deadline-based frame pacing for the render loop.
+    Frames are scheduled on a fixed grid (start + n*period) so render cost does
+    not stretch the period; overruns skip ahead instead of bursting. While nothing
+    animates the loop drops to idle_fps and can be woken early via wake().
+    """
+    def __init__(self, fps=25, idle_fps=2, stop_event=None, history=512):
+        self._stop = stop_event or threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.fps = 25.0
+        self.idle_fps = 2.0
+        self.configure(fps, idle_fps)
+        self._deadline = None
+        self._frame_start = None
+        self._costs = deque(maxlen=int(history))
+        self._periods = deque(maxlen=int(history))
+        self._last_start = None
+        self._frames = 0
+        self._idle_frames = 0
+        self._overruns = 0
+        self._wakeups = 0
+        self._animating = False
+
+    def configure(self, fps=None, idle_fps=None):
+        if fps is not None:
+            try: self.fps = min(240.0, max(1.0, float(fps)))
+            except (TypeError, ValueError): pass
+        if idle_fps is not None:
+            try: self.idle_fps = min(self.fps, max(0.1, float(idle_fps)))
+            except (TypeError, ValueError): pass
+
+    def wake(self):
+        """Signal a state change so an idle loop renders straight away."""
+        self._wake.set()
+
+    def stop(self):
+        """Stop the loop; an idle wait returns at once."""
+        self._stop.set()
+        self._wake.set()
+
+    def begin_frame(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._last_start is not None:
+                self._periods.append(now - self._last_start)
+            self._last_start = now
+        self._frame_start = now
+        return now
+
+    def end_frame(self, animating=True):
+        """Record the frame cost and sleep until the next deadline. Returns False once stopped."""
+        now = time.monotonic()
+        cost = now - (self._frame_start if self._frame_start is not None else now)
+        with self._lock:
+            self._costs.append(cost)
+            self._frames += 1
+            self._animating = bool(animating)
+
+        if not animating:
+            with self._lock:
+                self._idle_frames += 1
+            self._deadline = None
+            # idle_fps can be as low as 0.1: wait in short slices so a set stop_event is seen promptly
+            until = now + 1.0 / self.idle_fps
+            woke = False
+            while not woke and not self._stop.is_set():
+                left = until - time.monotonic()
+                if left <= 0:
+                    break
+                woke = self._wake.wait(min(left, 0.25))
+            self._wake.clear()
+            if woke:
+                with self._lock:
+                    self._wakeups += 1
+            return not self._stop.is_set()
+
+        period = 1.0 / self.fps
+        if self._deadline is None:
+            self._deadline = self._frame_start + period
+        else:
+            self._deadline += period
+        if now > self._deadline:
+            # overran: count it and realign to the grid rather than catching up with a burst
+            missed = int((now - self._deadline) / period) + 1
+            with self._lock:
+                self._overruns += 1
+            self._deadline += missed * period
+        self._wake.clear()
+        self._stop.wait(max(0.0, self._deadline - time.monotonic()))
+        return not self._stop.is_set()
+
+    def get_stats(self):
+        with self._lock:
+            costs = sorted(self._costs)
+            periods = list(self._periods)
+            out = {
+                "target_fps": self.fps,
+                "idle_fps": self.idle_fps,
+                "animating": self._animating,
+                "frames": self._frames,
+                "idle_frames": self._idle_frames,
+                "overruns": self._overruns,
+                "wakeups": self._wakeups,
+            }
+        if costs:
+            out["frame_ms_mean"] = round(1000.0 * sum(costs) / len(costs), 3)
+            out["frame_ms_p99"] = round(1000.0 * costs[min(len(costs) - 1, int(0.99 * len(costs)))], 3)
+            out["frame_ms_max"] = round(1000.0 * costs[-1], 3)
+        if periods:
+            mean_p = sum(periods) / len(periods)
+            out["achieved_fps"] = round(1.0 / mean_p, 2) if mean_p > 0 else None
+        return out
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Headless render benchmark: drives the real palette/compositor/effect pipeline
+into a RecordingStrip and reports achieved FPS, per-frame cost and pixel changes.
+
+  python3 scripts/bench_render.py --ports 48 --frames 500 --out /tmp/frames.elfr
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import compositor  # noqa: E402
+from effects import EffectEngine  # noqa: E402
+from led_driver import ColorPalette, LedStrip  # noqa: E402
+
+
+def synthetic_state(ports, vlans, seed=1):
+    rnd = random.Random(seed)
+    return {
+        p: {
+            "vlan": rnd.choice(vlans),
+            "speed": rnd.choice([10, 100, 1000, 1000, 2500, 10000]),
+            "up": rnd.random() < 0.7,
+            "ifIndex": p,
+            "ifName": f"Port {p}",
+        }
+        for p in range(1, ports + 1)
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--config", default=str(ROOT / "config.json"))
+    ap.add_argument("--ports", type=int, default=48)
+    ap.add_argument("--leds-per-port", type=int, default=2)
+    ap.add_argument("--frames", type=int, default=500)
+    ap.add_argument("--fps", type=float, default=0, help="pace frames (0 = as fast as possible)")
+    ap.add_argument("--no-numpy", action="store_true", help="force the per-pixel render path")
+    ap.add_argument("--flash", type=int, default=0, help="number of ports under a flash effect")
+    ap.add_argument("--link-churn", type=float, default=0.0, help="chance per frame that one port flips link state")
+    ap.add_argument("--out", help="write the recorded frames to this capture file")
+    args = ap.parse_args()
+
+    cfg = json.loads(Path(args.config).read_text())
+    cfg["device"]["ports"]["count"] = args.ports
+    cfg["device"]["leds_per_port"] = args.leds_per_port
+    led = cfg.get("led", {})
+
+    strip = LedStrip(args.ports, args.leds_per_port, brightness=led.get("brightness", 64),
+                     strip_type=led.get("type", "ws2812b"), color_order=led.get("color_order", "GRB"),
+                     gamma=led.get("gamma", 1.0), white_balance=led.get("white_balance"),
+                     backend="record", record_frames=args.frames)
+    palette = ColorPalette(strip.pack)
+    frame_comp = None
+    if compositor.available() and not args.no_numpy:
+        frame_comp = compositor.FrameCompositor(strip)
+    engine = EffectEngine()
+    for p in range(1, args.flash + 1):
+        engine.start("flash", key=f"flash:{p}", ports=[p], pulses=10 ** 6)
+
+    vlans = [int(v) for v in (cfg.get("vlan_colors") or {"1": ""}).keys()] + [None]
+    state = synthetic_state(args.ports, vlans)
+    rnd = random.Random(2)
+    period = 1.0 / args.fps if args.fps > 0 else 0.0
+
+    t_start = time.monotonic()
+    next_t = t_start
+    for _ in range(args.frames):
+        strip.begin_frame()
+        if args.link_churn and rnd.random() < args.link_churn:
+            p = rnd.randint(1, args.ports)
+            state = dict(state)
+            state[p] = dict(state[p], up=not state[p]["up"])
+        fx = engine.evaluate(time.time(), cfg, args.leds_per_port)
+        compositor.render_frame(strip, palette, frame_comp, fx, state, cfg)
+        strip.show()
+        if period:
+            next_t += period
+            time.sleep(max(0.0, next_t - time.monotonic()))
+    elapsed = time.monotonic() - t_start
+
+    stats = strip.get_stats()
+    report = {
+        "path": "numpy" if frame_comp is not None else "python",
+        "frames": args.frames,
+        "elapsed_s": round(elapsed, 3),
+        "loop_fps": round(args.frames / elapsed, 1) if elapsed > 0 else None,
+        "strip": {k: v for k, v in stats.items() if k != "recorder"},
+        "recorder": stats.get("recorder"),
+    }
+    if args.out:
+        report["written_frames"] = strip.strip.dump(args.out)
+        report["out"] = args.out
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
 import asyncio
+import bisect
+import random
 import re
 import threading
+import time
+from collections import deque
 from typing import Optional, Dict, Any
 
+from state_bus import StateBus
+from traffic import COUNTER_COLUMNS, COUNTER_NAMES, TrafficTracker
+
 # pysnmp >= 7 asyncio API
 from pysnmp.hlapi.v3arch.asyncio import (
     SnmpEngine, CommunityData, UdpTransportTarget, ContextData,
-    ObjectType, ObjectIdentity, walk_cmd, get_cmd
+    ObjectType, ObjectIdentity, walk_cmd, bulk_cmd, get_cmd
 )
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+from pysnmp.entity import config as snmp_config
+from pysnmp.entity.rfc3413 import ntfrcv
+from pysnmp.carrier.asyncio.dgram import udp as snmp_udp
 
 # ---- Common OIDs we already use ----
 OID_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
@@ -17,6 +28,12 @@ OID_IFHSPEED  = '1.3.6.1.2.1.31.1.1.1.15'
 OID_IFOPER    = '1.3.6.1.2.1.2.2.1.8'
 OID_PVID      = '1.3.6.1.2.1.17.7.1.4.5.1.1'
 OID_VLAN_CURR_UNTAG = '1.3.6.1.2.1.17.7.1.4.2.1.4'
+OID_IFINDEX   = '1.3.6.1.2.1.2.2.1.1'
+
+# ---- Notifications ----
+OID_SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+OID_TRAP_LINK_DOWN = '1.3.6.1.6.3.1.1.5.3'
+OID_TRAP_LINK_UP   = '1.3.6.1.6.3.1.1.5.4'
 
 # ---- Switch temperature candidates (UniFi) ----
 # Seen working on some USW models (returns INTEGER Celsius)
@@ -25,19 +42,149 @@ UBNT_TEMP_CANDIDATES = [
     '1.3.6.1.4.1.41112.1.1.43.1.15.1.3.1',
 ]
 
+# Switch temperature: own poll rate; a found source is re-discovered only after
+# this many failed reads in a row, and "no source" is re-checked hourly
+DEFAULT_TEMP_INTERVAL = 30.0
+TEMP_REDISCOVER_AFTER = 3
+TEMP_NONE_RETRY_SEC = 3600.0
+
 # ENTITY-SENSOR-MIB (entPhySensor*)
 ENT_TYPE  = '1.3.6.1.2.1.99.1.1.1.1'  # entPhySensorType
 ENT_SCALE = '1.3.6.1.2.1.99.1.1.1.2'  # entPhySensorScale (ignored here)
 ENT_VALUE = '1.3.6.1.2.1.99.1.1.1.4'  # entPhySensorValue
 
-async def _walk(engine, target, community, base_oid) -> Dict[int, Any]:
+# Retry a trap listener whose port could not be bound after this long
+TRAP_RETRY_SEC = 30.0
+# Rebuild the persistent engine/transport after this many failed cycles in a row
+REBUILD_AFTER_FAILURES = 3
+# Requests in flight at once towards one switch (concurrent walks share this cap)
+DEFAULT_MAX_INFLIGHT = 4
+# GETBULK rows per column per request (v2c); 0 falls back to GETNEXT walks
+DEFAULT_MAX_REPETITIONS = 25
+_ERR_TOO_BIG = 1
+# varbinds per GET PDU in the fast tier
+GET_CHUNK = 48
+
+# Polled every fast cycle; a change triggers a slow (full) refresh straight away
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+OID_IF_NUMBER = '1.3.6.1.2.1.2.1.0'
+OID_IF_TABLE_LAST_CHANGE = '1.3.6.1.2.1.31.1.5.0'
+_CHANGE_MARKERS = {
+    OID_SYS_UPTIME: 'uptime',
+    OID_IF_NUMBER: 'if_number',
+    OID_IF_TABLE_LAST_CHANGE: 'if_last_change',
+}
+
+# Per-request budget: pysnmp timeout x (retries + 1), then the request is abandoned
+DEFAULT_REQUEST_TIMEOUT = 1.0
+DEFAULT_REQUEST_RETRIES = 1
+# While the switch is down, cycles back off exponentially (with jitter) up to this
+DEFAULT_BACKOFF_MAX = 30.0
+# A port whose link state is older than this is reported (and drawn) as stale
+DEFAULT_STALE_AFTER = 10.0
+# Poll-cycle latency histogram bucket upper bounds (ms)
+CYCLE_MS_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class SnmpError(Exception):
+    """Transport-level SNMP failure (timeout, unreachable host, ...)."""
+
+class SnmpTimeout(SnmpError):
+    """No response within the request deadline."""
+
+def _split_host(host, default_port=161):
+    """'switch' or 'switch:1161' -> (host, port)."""
+    h = str(host or '').strip()
+    if h.count(':') == 1:
+        name, _, port = h.partition(':')
+        if port.isdigit():
+            return name, int(port)
+    return h, default_port
+
+class _Session:
+    """SnmpEngine + transport target + credentials, reused across poll cycles on one event loop."""
+    def __init__(self, key, engine, target, auth, max_inflight=DEFAULT_MAX_INFLIGHT,
+                 max_repetitions=0, deadline=None):
+        self.key = key
+        self.engine = engine
+        self.target = target
+        self.auth = auth
+        self.context = ContextData()
+        self.inflight = asyncio.Semaphore(max(1, int(max_inflight)))
+        self.max_repetitions = max(0, int(max_repetitions))
+        self.deadline = deadline or (DEFAULT_REQUEST_TIMEOUT * (DEFAULT_REQUEST_RETRIES + 1) + 0.25)
+        # wire counters, fed by the engine's observer (retransmissions included)
+        self.packets_tx = self.packets_rx = 0
+        self.bytes_tx = self.bytes_rx = 0
+        engine.observer.register_observer(
+            self._count, 'rfc3412.sendPdu', 'rfc3412.receiveMessage:response')
+
+    @classmethod
+    async def open(cls, host, community, version='v2c', timeout=DEFAULT_REQUEST_TIMEOUT,
+                   retries=DEFAULT_REQUEST_RETRIES, max_inflight=DEFAULT_MAX_INFLIGHT,
+                   max_repetitions=DEFAULT_MAX_REPETITIONS):
+        engine = SnmpEngine()
+        target = await UdpTransportTarget.create(_split_host(host), timeout=timeout, retries=retries)
+        v1 = str(version).lower() == 'v1'
+        auth = CommunityData(community, mpModel=0 if v1 else 1)
+        max_rep = 0 if v1 else max_repetitions  # GETBULK is v2c-only
+        # hard stop a little after pysnmp's own timeout/retry schedule would give up
+        deadline = float(timeout) * (int(retries) + 1) + 0.25
+        return cls((host, community, version, max_inflight, max_repetitions, timeout, retries),
+                   engine, target, auth, max_inflight, max_rep, deadline)
+
+    @property
+    def bulk(self):
+        return self.max_repetitions > 0
+
+    def _count(self, engine, execpoint, variables, ctx):
+        if execpoint == 'rfc3412.sendPdu':
+            self.packets_tx += 1
+            self.bytes_tx += len(variables.get('outgoingMessage') or b'')
+        else:
+            self.packets_rx += 1
+            self.bytes_rx += len(variables.get('wholeMsg') or b'')
+
+    def counters(self):
+        return self.packets_tx + self.packets_rx, self.bytes_tx + self.bytes_rx
+
+    def close(self):
+        try:
+            self.engine.observer.unregister_observer(self._count)
+        except Exception:
+            pass
+        try:
+            self.engine.close_dispatcher()
+        except Exception:
+            pass
+
+async def _request(sess, aw):
+    """Await one pysnmp request, abandoning it after the session's deadline."""
+    try:
+        return await asyncio.wait_for(aw, sess.deadline)
+    except asyncio.TimeoutError:
+        raise SnmpTimeout(f"no response within {sess.deadline:.2f}s") from None
+
+def _check(errInd):
+    if errInd:
+        msg = str(errInd)
+        raise (SnmpTimeout if 'timeout' in msg.lower() else SnmpError)(msg)
+
+async def _getnext_walk(sess, base_oid) -> Dict[int, Any]:
     out = {}
-    async for errInd, errStat, errIdx, varBinds in walk_cmd(
-        engine, CommunityData(community), target, ContextData(),
+    rows = walk_cmd(
+        sess.engine, sess.auth, sess.target, sess.context,
         ObjectType(ObjectIdentity(base_oid)),
         lookupMib=False, lexicographicMode=False
-    ):
-        if errInd or errStat:
+    )
+    while True:
+        # each step is one request/response; hold an in-flight slot only for that
+        async with sess.inflight:
+            try:
+                errInd, errStat, errIdx, varBinds = await _request(sess, rows.__anext__())
+            except StopAsyncIteration:
+                break
+        _check(errInd)
+        if errStat:
             return out
         for ot in varBinds:
             oid = ot[0].prettyPrint()
@@ -48,11 +195,85 @@ async def _walk(engine, target, community, base_oid) -> Dict[int, Any]:
             out[idx] = ot[1]
     return out
 
-async def _get_one(engine, target, community, oid: str):
-    errInd, errStat, errIdx, varBinds = await get_cmd(
-        engine, CommunityData(community), target, ContextData(),
-        ObjectType(ObjectIdentity(oid)), lookupMib=False
-    )
+def _end_of_column(val):
+    return isinstance(val, (EndOfMibView, NoSuchObject, NoSuchInstance))
+
+async def _bulk_walk(sess, base_oids, scalars=None):
+    """
+    GETBULK over one or more table columns at once: every request carries the
+    current cursor of each column still in progress, so the columns of a table
+    share PDUs. Returns one {last sub-id: value} dict per column.
+    scalars ({oid: None}) go in the first request as non-repeaters and are filled
+    in from its response, so e.g. sysUpTime is read in the same PDU as the first rows.
+    """
+    prefixes = [tuple(int(x) for x in o.split('.')) for o in base_oids]
+    outs = [{} for _ in base_oids]
+    cursors = list(base_oids)
+    last = list(prefixes)   # last OID seen per column; must strictly increase
+    active = list(range(len(base_oids)))
+    max_rep = sess.max_repetitions
+    nonrep = list(scalars or ())
+    while active:
+        async with sess.inflight:
+            errInd, errStat, errIdx, varBinds = await _request(sess, bulk_cmd(
+                sess.engine, sess.auth, sess.target, sess.context, len(nonrep), max_rep,
+                *[ObjectType(ObjectIdentity(o)) for o in nonrep],
+                *[ObjectType(ObjectIdentity(cursors[c])) for c in active],
+                lookupMib=False
+            ))
+        _check(errInd)
+        if errStat:
+            if int(errStat) == _ERR_TOO_BIG and max_rep > 1:
+                max_rep //= 2
+                continue
+            break
+        if not varBinds:
+            break
+        if nonrep:
+            for o, (name, val) in zip(nonrep, varBinds):
+                if not _end_of_column(val):
+                    scalars[o] = val
+            varBinds = varBinds[len(nonrep):]
+            nonrep = []
+        ncol = len(active)
+        done = set()
+        progressed = set()
+        for i, (name, val) in enumerate(varBinds):
+            c = active[i % ncol]
+            if c in done:
+                continue
+            oid = tuple(name)
+            pre = prefixes[c]
+            if _end_of_column(val) or len(oid) <= len(pre) or oid[:len(pre)] != pre:
+                done.add(c)
+                continue
+            if oid <= last[c]:
+                # same check walk_cmd makes; a looping agent would otherwise never end the walk
+                raise SnmpError(f"OID not increasing: {name.prettyPrint()} after {'.'.join(map(str, last[c]))}")
+            last[c] = oid
+            outs[c][oid[-1]] = val
+            cursors[c] = name.prettyPrint()
+            progressed.add(c)
+        active = [c for c in active if c not in done and c in progressed]
+    return outs
+
+async def _walk(sess, base_oid) -> Dict[int, Any]:
+    if sess.bulk:
+        return (await _bulk_walk(sess, [base_oid]))[0]
+    return await _getnext_walk(sess, base_oid)
+
+async def _walk_columns(sess, *base_oids):
+    """Walk several columns of the same table; one shared GETBULK stream on v2c."""
+    if sess.bulk:
+        return await _bulk_walk(sess, list(base_oids))
+    return await asyncio.gather(*[_getnext_walk(sess, o) for o in base_oids])
+
+async def _get_one(sess, oid: str):
+    async with sess.inflight:
+        errInd, errStat, errIdx, varBinds = await _request(sess, get_cmd(
+            sess.engine, sess.auth, sess.target, sess.context,
+            ObjectType(ObjectIdentity(oid)), lookupMib=False
+        ))
     if errInd or errStat:
         return None
     for vb in varBinds:
@@ -76,174 +297,764 @@ def _bitmap_ports_msb(mask: bytes):
                 ports.add(i * 8 + bit + 1)
     return ports
 
+def _same_port_state(a, b):
+    """Equal apart from the 'seen' timestamps (which move every cycle)."""
+    if a.keys() != b.keys():
+        return False
+    return all(a[k] == b[k] for k in a if k != 'seen')
+
 def _portnum_from_ifname(name: str) -> Optional[int]:
     m = re.search(r'(\d+)\s*$', name.strip())
     return int(m.group(1)) if m else None
 
-class SnmpPoller(threading.Thread):
-    def __init__(self, host, community, interval_sec=5, port_count=16, stop_event=None):
-        super().__init__(daemon=True)
+class _TrapListener:
+    """
+    linkUp/linkDown receiver (v1/v2c traps and informs) with its own engine,
+    running on the poller's event loop. on_link is called for every
+    notification (ifIndex/up are None when it does not name an interface).
+    Create it with `await _TrapListener.open(...)` so bind errors are raised.
+    """
+    def __init__(self, on_link, engine, key):
+        self.on_link = on_link  # on_link(ifIndex, up, t_recv, source_ip)
+        self.key = key
+        self.engine = engine
+        self._rcv = ntfrcv.NotificationReceiver(self.engine, self._on_notification)
+
+    @classmethod
+    async def open(cls, on_link, listen='0.0.0.0', port=162, community='public'):
+        engine = SnmpEngine()
+        try:
+            transport = snmp_udp.UdpTransport().open_server_mode((listen, int(port)))
+            snmp_config.add_transport(engine, snmp_udp.DOMAIN_NAME, transport)
+            # open_server_mode only schedules the bind; wait for it so EADDRINUSE/EACCES surface here
+            await transport._lport
+            snmp_config.add_v1_system(engine, 'etherlight-traps', community)
+        except BaseException:
+            try:
+                engine.close_dispatcher()
+            except Exception:
+                pass
+            raise
+        return cls(on_link, engine, (listen, int(port), community))
+
+    def _on_notification(self, engine, state_ref, ctx_engine_id, ctx_name, varBinds, cb_ctx):
+        t = time.monotonic()
+        try:
+            src = engine.message_dispatcher.get_transport_info(state_ref)[1][0]
+        except Exception:
+            src = None
+        trap = idx = oper = None
+        for name, val in varBinds:
+            oid = name.prettyPrint()
+            if oid == OID_SNMP_TRAP_OID:
+                trap = val.prettyPrint()
+            elif oid.startswith(OID_IFOPER + '.'):
+                try:
+                    idx, oper = int(oid.rsplit('.', 1)[1]), int(val)
+                except Exception:
+                    pass
+            elif oid.startswith(OID_IFINDEX + '.') and idx is None:
+                try:
+                    idx = int(val)
+                except Exception:
+                    pass
+        if idx is None or (trap not in (OID_TRAP_LINK_UP, OID_TRAP_LINK_DOWN) and oper is None):
+            self.on_link(None, None, t, src)
+            return
+        up = (oper == 1) if oper is not None else (trap == OID_TRAP_LINK_UP)
+        self.on_link(idx, up, t, src)
+
+    def close(self):
+        try:
+            self._rcv.close(self.engine)
+        except Exception:
+            pass
+        try:
+            self.engine.close_dispatcher()
+        except Exception:
+            pass
+
+class SnmpPoller:
+    """
+    Two-tier poller: every fast_interval_sec one GET fetches ifOperStatus for the
+    mapped ports; names, speeds, PVIDs and the port mapping are
+    re-walked every interval_sec, or at once if sysUpTime/ifNumber/ifTableLastChange
+    say the switch rebooted or its interfaces changed.
+    One switch; PollerGroup runs its _main() as a task and feeds it traps.
+    """
+    def __init__(self, host, community, interval_sec=60, port_count=16, stop_event=None, version='v2c',
+                 max_inflight=DEFAULT_MAX_INFLIGHT, max_repetitions=DEFAULT_MAX_REPETITIONS,
+                 fast_interval_sec=1.0, counters=None,
+                 request_timeout_sec=DEFAULT_REQUEST_TIMEOUT, request_retries=DEFAULT_REQUEST_RETRIES,
+                 backoff_max_sec=DEFAULT_BACKOFF_MAX, stale_after_sec=DEFAULT_STALE_AFTER,
+                 temp_interval_sec=DEFAULT_TEMP_INTERVAL, bus=None, port_offset=0, switch_name=None):
+        self.name = switch_name or host
         self.host = host
         self.community = community
-        self.interval = max(1, int(interval_sec))
+        self.version = version or 'v2c'
+        self.slow_interval = max(1.0, float(interval_sec))
+        self.fast_interval = min(self.slow_interval, max(0.2, float(fast_interval_sec)))
         self.port_count = int(port_count)
+        self.max_inflight = max(1, int(max_inflight or DEFAULT_MAX_INFLIGHT))
+        self.max_repetitions = max(0, int(DEFAULT_MAX_REPETITIONS if max_repetitions is None else max_repetitions))
+        self.request_timeout = max(0.1, float(request_timeout_sec))
+        self.request_retries = max(0, int(request_retries))
+        self.backoff_max = max(self.fast_interval, float(backoff_max_sec))
+        self.stale_after = max(1.0, float(stale_after_sec))
         self.stop_event = stop_event or threading.Event()
-        self.state_lock = threading.Lock()
+        # RLock: bus listeners run while it is held and may read the state back
+        self.state_lock = threading.RLock()
         self.state: Dict[int, Dict[str, Any]] = {}
+        # published view: every state change is diffed per port and pushed to the bus
+        self.bus = bus if bus is not None else StateBus()
+        self.switch_name = switch_name
+        self._port_offset = int(port_offset)
+        self._pub: Dict[int, Dict[str, Any]] = {}
+        self._next_stale_at = None
         self.model = ""
         self.switch_temp_c: Optional[float] = None
+        self.temp_interval = max(1.0, float(temp_interval_sec))
+        self._temp_src = None        # ('oid', oid) | ('entity', index) | ('none',) once discovered
+        self._temp_fails = 0
+        self._temp_due = 0.0
+        self._temp_retry_at = 0.0
+        self.ready = threading.Event()  # set once the first poll cycle has finished (ok or not)
+        self._sess: Optional[_Session] = None
+        self.address = None          # resolved switch IP (matches trap sources)
+        self._fail_streak = 0
+        self._streak_at_build = 0    # fail streak when the current session was built
+        self._port_by_ifindex: Dict[int, int] = {}
+        self._marks = None           # change markers seen at the last slow refresh
+        self._slow_due = 0.0
+        self._slow_port_count = None
+        self.counters_cfg = dict(counters or {})
+        self.traffic = TrafficTracker(self.counters_cfg.get('history', 120))
+        self._counters_due = 0.0
+        self._repoll = set()         # ifIndexes a trap asked us to re-read
+        self._kick = None            # asyncio.Event on the poller loop
+        self._loop = None
+        self._trap_pending = deque(maxlen=256)   # receive times not yet on the LEDs
+        self._trap_to_state = deque(maxlen=256)
+        self._trap_to_led = deque(maxlen=256)
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "cycles": 0,
+            "failures": 0,
+            "sessions_built": 0,
+            "setup_ms_last": None,
+            "query_ms_last": None,
+            "setup_ms_total": 0.0,
+            "query_ms_total": 0.0,
+            "packets_last": None,
+            "bytes_last": None,
+            "packets_total": 0,
+            "bytes_total": 0,
+            "fast_cycles": 0,
+            "slow_cycles": 0,
+            "layout_changes": 0,
+            "last_tier": None,
+            "traps_received": 0,
+            "traps_applied": 0,
+            "traps_ignored": 0,
+            "trap_repolls": 0,
+            "counter_polls": 0,
+            "temp_source": None,
+            "temp_discoveries": 0,
+            "temp_reads": 0,
+            "backoff_sec": 0.0,
+            "last_ok": None,
+            "errors": {},
+            "cycle_ms_hist": [0] * (len(CYCLE_MS_BUCKETS) + 1),
+            "last_error": None,
+        }
 
     def get_state(self):
+        """Copy of this switch's published port state (local port numbers). Prefer bus.snapshot()."""
+        with self.state_lock:
+            return {k: v.copy() for k, v in self._pub.items()}
+
+    def _publish_locked(self):
+        """
+        Diff self.state against the last published view and push changed ports to
+        the bus (state_lock held). 'stale' is derived here; a change of only the
+        'seen' timestamps is stored without bumping the bus version.
+        """
+        now = time.time()
+        off, prev = self._port_offset, self._pub
+        view, updates, changed = {}, {}, []
+        next_stale = None
+        for port, s in self.state.items():
+            seen = (s.get('seen') or {}).get('oper')
+            stale = seen is None or now - seen > self.stale_after
+            if not stale:
+                t = seen + self.stale_after
+                next_stale = t if next_stale is None else min(next_stale, t)
+            v = dict(s, stale=stale)
+            if self.switch_name is not None:
+                v['switch'] = self.switch_name
+            old = prev.get(port)
+            if old is None or not _same_port_state(old, v):
+                updates[port + off] = v
+                changed.append(port + off)
+            elif old.get('seen') != v.get('seen'):
+                updates[port + off] = v
+            else:
+                v = old
+            view[port] = v
+        removed = [p + off for p in prev if p not in self.state]
+        self._pub = view
+        self._next_stale_at = next_stale
+        if updates or removed:
+            self.bus.publish(updates, changed, removed)
+
+    def _set_state(self, state):
         with self.state_lock:
-            return {k: v.copy() for k, v in self.state.items()}
+            self.state = state
+            self._publish_locked()
 
-    async def _read_switch_temp(self, eng, tgt) -> Optional[float]:
+    def set_port_offset(self, offset):
+        """Move this switch's ports on the shared bus (ports are re-published at the new place)."""
+        with self.state_lock:
+            if int(offset) == self._port_offset:
+                return
+            self.bus.publish({}, (), [p + self._port_offset for p in self._pub])
+            self._port_offset = int(offset)
+            self._pub = {}
+            self._publish_locked()
+
+    def get_stats(self):
+        with self.stats_lock:
+            out = dict(self.stats)
+            out["errors"] = dict(out["errors"])
+            hist = list(out.pop("cycle_ms_hist"))
+        # ordered buckets: le = upper bound in ms (None = above the last bound)
+        out["cycle_ms_hist"] = [{"le": le, "count": n}
+                                for le, n in zip(list(CYCLE_MS_BUCKETS) + [None], hist)]
+        out["fail_streak"] = self._fail_streak
+        n = max(1, out["cycles"])
+        out["setup_ms_mean"] = round(out.pop("setup_ms_total") / n, 3)
+        out["query_ms_mean"] = round(out.pop("query_ms_total") / n, 3)
+        out["packets_per_poll"] = round(out["packets_total"] / n, 1)
+        out["bytes_per_poll"] = round(out["bytes_total"] / n, 1)
+        out["max_repetitions"] = self.max_repetitions if str(self.version).lower() != 'v1' else 0
+        out["traffic"] = self.traffic.get_stats()
+        out["switch_temp_c"] = self.switch_temp_c
+        with self.state_lock:
+            lat = {"trap_to_state_ms": sorted(self._trap_to_state), "trap_to_led_ms": sorted(self._trap_to_led)}
+        for name, vals in lat.items():
+            if vals:
+                out[name] = {
+                    "mean": round(sum(vals) / len(vals), 3),
+                    "p99": round(vals[min(len(vals) - 1, int(0.99 * len(vals)))], 3),
+                    "max": round(vals[-1], 3),
+                    "n": len(vals),
+                }
+        return out
+
+    def add_listener(self, fn):
+        """fn() is called (from the poller thread) whenever the published port state changed."""
+        self.bus.add_listener(fn)
+
+    def frame_shown(self, state_read_at):
+        """Render loop hook: a frame built from state read at `state_read_at` (monotonic) is on the LEDs."""
+        if not self._trap_pending:
+            return
+        now = time.monotonic()
+        with self.state_lock:
+            while self._trap_pending and self._trap_pending[0] <= state_read_at:
+                self._trap_to_led.append((now - self._trap_pending.popleft()) * 1000.0)
+
+    def configure(self, host=None, community=None, version=None, interval_sec=None, port_count=None,
+                  max_inflight=None, max_repetitions=None, fast_interval_sec=None,
+                  counters=None, request_timeout_sec=None, request_retries=None, backoff_max_sec=None,
+                  stale_after_sec=None, temp_interval_sec=None):
+        """Apply new settings; the session is rebuilt on the next cycle if the target changed."""
+        if host is not None: self.host = host
+        if community is not None: self.community = community
+        if version is not None: self.version = version
+        if interval_sec is not None: self.slow_interval = max(1.0, float(interval_sec))
+        if fast_interval_sec is not None: self.fast_interval = max(0.2, float(fast_interval_sec))
+        self.fast_interval = min(self.fast_interval, self.slow_interval)
+        if port_count is not None: self.port_count = int(port_count)
+        if max_inflight is not None: self.max_inflight = max(1, int(max_inflight))
+        if max_repetitions is not None: self.max_repetitions = max(0, int(max_repetitions))
+        if counters is not None: self.counters_cfg = dict(counters)
+        if request_timeout_sec is not None: self.request_timeout = max(0.1, float(request_timeout_sec))
+        if request_retries is not None: self.request_retries = max(0, int(request_retries))
+        if backoff_max_sec is not None: self.backoff_max = max(self.fast_interval, float(backoff_max_sec))
+        if stale_after_sec is not None: self.stale_after = max(1.0, float(stale_after_sec))
+        if temp_interval_sec is not None: self.temp_interval = max(1.0, float(temp_interval_sec))
+        self._wakeup()
+
+    def _wakeup(self):
+        loop, kick = self._loop, self._kick
+        if loop is not None and kick is not None:
+            try:
+                loop.call_soon_threadsafe(kick.set)
+            except RuntimeError:
+                pass
+
+    async def _session(self):
+        key = (self.host, self.community, self.version, self.max_inflight, self.max_repetitions,
+               self.request_timeout, self.request_retries)
+        sess = self._sess
+        if (sess is not None and sess.key == key
+                and self._fail_streak - self._streak_at_build < REBUILD_AFTER_FAILURES):
+            return sess
+        if sess is not None:
+            if sess.key[0] != key[0]:
+                self._temp_src = None  # different switch: find its temperature source again
+            sess.close()
+            self._sess = None
+        sess = await _Session.open(self.host, self.community, self.version,
+                                   timeout=self.request_timeout, retries=self.request_retries,
+                                   max_inflight=self.max_inflight,
+                                   max_repetitions=self.max_repetitions)
+        self._sess = sess
+        self.address = getattr(sess.target, 'transport_address', (None,))[0]
+        self._marks = None  # new target (or recovering): start with a full refresh
+        self._streak_at_build = self._fail_streak
+        with self.stats_lock:
+            self.stats["sessions_built"] += 1
+        return sess
+
+    @staticmethod
+    def _celsius(v):
+        try:
+            val = float(str(v))
+        except Exception:
+            return None
+        return val if -40.0 < val < 150.0 else None
+
+    async def _discover_temp_source(self, sess):
+        """Find which temperature source this switch answers: ('oid', oid), ('entity', index) or ('none',)."""
         # 1) Try UBNT private OIDs first (simple integers in Celsius)
         for oid in UBNT_TEMP_CANDIDATES:
-            v = await _get_one(eng, tgt, self.community, oid)
-            if v is None:
-                continue
-            try:
-                val = float(str(v))
-                if -40.0 < val < 150.0:
-                    return val
-            except Exception:
-                continue
+            v = await _get_one(sess, oid)
+            if v is not None and self._celsius(v) is not None:
+                return ('oid', oid)
 
         # 2) Fall back to ENTITY-SENSOR-MIB: any entPhySensorType == degreesCelsius
-        try:
-            types = await _walk(eng, tgt, self.community, ENT_TYPE)
-            values = await _walk(eng, tgt, self.community, ENT_VALUE)
-            # entPhySensorType often returns an integer; 8 == degreesCelsius (per the MIB)
-            for idx, t in types.items():
-                t_s = str(t).lower()
-                is_celsius = ('celsius' in t_s)
-                if not is_celsius:
-                    try:
-                        is_celsius = (int(str(t)) == 8)
-                    except Exception:
-                        is_celsius = False
-                if not is_celsius:
-                    continue
-                raw = values.get(idx)
-                if raw is None:
-                    continue
+        types, values = await asyncio.gather(_walk(sess, ENT_TYPE), _walk(sess, ENT_VALUE))
+        # entPhySensorType often returns an integer; 8 == degreesCelsius (per the MIB)
+        for idx, t in types.items():
+            is_celsius = ('celsius' in str(t).lower())
+            if not is_celsius:
                 try:
-                    val = float(str(raw))
-                    if -40.0 < val < 150.0:
-                        return val
+                    is_celsius = (int(str(t)) == 8)
                 except Exception:
-                    continue
-        except Exception:
-            pass
+                    is_celsius = False
+            if is_celsius and values.get(idx) is not None and self._celsius(values[idx]) is not None:
+                return ('entity', idx)
+        return ('none',)
 
-        return None
+    async def _read_switch_temp(self, sess) -> Optional[float]:
+        """
+        Read the remembered temperature source (a single GET); discover it first
+        if unknown. Re-discovers after TEMP_REDISCOVER_AFTER failed reads, or
+        periodically when the switch had no usable source.
+        """
+        now = time.monotonic()
+        src = self._temp_src
+        if src is None or (src[0] == 'none' and now >= self._temp_retry_at):
+            src = self._temp_src = await self._discover_temp_source(sess)
+            self._temp_fails = 0
+            self._temp_retry_at = now + TEMP_NONE_RETRY_SEC
+            with self.stats_lock:
+                self.stats["temp_discoveries"] += 1
+                self.stats["temp_source"] = ':'.join(str(x) for x in src)
+        if src[0] == 'none':
+            return None
+        oid = src[1] if src[0] == 'oid' else f"{ENT_VALUE}.{src[1]}"
+        val = self._celsius(await _get_one(sess, oid))
+        with self.stats_lock:
+            self.stats["temp_reads"] += 1
+        if val is None:
+            self._temp_fails += 1
+            if self._temp_fails >= TEMP_REDISCOVER_AFTER:
+                self._temp_src = None
+            return None
+        self._temp_fails = 0
+        return val
 
-    async def _poll_once_async(self):
-        eng = SnmpEngine()
-        tgt = await UdpTransportTarget.create((self.host, 161))
+    async def _poll_temp(self, sess):
+        # Switch temperature is optional; never let it fail the cycle
         try:
-            ifnames_raw = await _walk(eng, tgt, self.community, OID_IFNAME)
-            speeds_raw  = await _walk(eng, tgt, self.community, OID_IFHSPEED)
-            opers_raw   = await _walk(eng, tgt, self.community, OID_IFOPER)
-
-            ifnames = {i: str(v) for i, v in ifnames_raw.items()}
-            speeds  = {i: int(v) for i, v in speeds_raw.items() if str(v).isdigit()}
-            opers   = {i: int(v) for i, v in opers_raw.items() if str(v).isdigit()}
-
-            # PVID / VLAN mapping
-            pvid_raw = await _walk(eng, tgt, self.community, OID_PVID)
-            pvid_by_base = {base: int(v) for base, v in pvid_raw.items() if str(v).isdigit()}
-            if not pvid_by_base:
-                vlan_untag_raw = await _walk(eng, tgt, self.community, OID_VLAN_CURR_UNTAG)
-                base_to_vlan = {}
-                for vlan_id, octs in vlan_untag_raw.items():
-                    for base_port in _bitmap_ports_msb(_octets(octs)):
-                        base_to_vlan.setdefault(base_port, vlan_id)
-                pvid_by_base = base_to_vlan
-
-            # Choose physical ports (best effort)
-            candidates = sorted(ifnames.items(), key=lambda kv: kv[0])
-            phys = []
-            for ifIndex, name in candidates:
-                n = name.lower()
-                if any(s in n for s in ['eth', 'port', '/']) or n.isdigit():
-                    phys.append(ifIndex)
-                if len(phys) >= self.port_count:
+            temp = await self._read_switch_temp(sess)
+        except Exception:
+            temp = None
+            self._temp_fails += 1
+            if self._temp_fails >= TEMP_REDISCOVER_AFTER:
+                self._temp_src = None
+        with self.state_lock:
+            self.switch_temp_c = temp
+
+    async def _get_many(self, sess, oids):
+        """
+        One GET per chunk of OIDs -> {oid: value}; missing/noSuch entries are left out.
+        An error naming one varbind (SNMPv1 noSuchName fails the whole PDU) drops
+        that OID and retries the rest of the chunk.
+        """
+        out = {}
+        for i in range(0, len(oids), GET_CHUNK):
+            chunk = oids[i:i + GET_CHUNK]
+            while chunk:
+                async with sess.inflight:
+                    errInd, errStat, errIdx, varBinds = await _request(sess, get_cmd(
+                        sess.engine, sess.auth, sess.target, sess.context,
+                        *[ObjectType(ObjectIdentity(o)) for o in chunk], lookupMib=False
+                    ))
+                _check(errInd)
+                if errStat:
+                    bad = int(errIdx or 0)
+                    if 1 <= bad <= len(chunk):
+                        chunk = chunk[:bad - 1] + chunk[bad:]
+                        continue
                     break
-            if len(phys) < self.port_count:
-                phys = [idx for idx, _ in candidates[:self.port_count]]
-
-            new_state: Dict[int, Dict[str, Any]] = {}
-            port = 1
-            for ifIndex in phys[:self.port_count]:
-                base = _portnum_from_ifname(ifnames.get(ifIndex, ""))
-                vlan = pvid_by_base.get(base) if base is not None else None
-                speed = speeds.get(ifIndex)
-                up = (opers.get(ifIndex) == 1)
-                new_state[port] = {
-                    'vlan': vlan,
-                    'speed': speed,
-                    'up': up,
-                    'ifIndex': ifIndex,
-                    'ifName': ifnames.get(ifIndex, str(ifIndex))
-                }
-                port += 1
+                for name, val in varBinds:
+                    if not _end_of_column(val):
+                        out[name.prettyPrint()] = val
+                break
+        return out
 
-            # Try to read switch temperature (non-fatal if it fails)
+    async def _poll_slow(self, sess):
+        """Full refresh: names, speeds, PVIDs and the ifIndex -> port mapping."""
+        # Independent tables go out together; sess.inflight caps what hits the switch at once
+        (ifnames_raw, speeds_raw, opers_raw), pvid_raw, marks = await asyncio.gather(
+            _walk_columns(sess, OID_IFNAME, OID_IFHSPEED, OID_IFOPER),
+            _walk(sess, OID_PVID),
+            self._get_many(sess, list(_CHANGE_MARKERS)),
+        )
+
+        ifnames = {i: str(v) for i, v in ifnames_raw.items()}
+        speeds  = {i: int(v) for i, v in speeds_raw.items() if str(v).isdigit()}
+        opers   = {i: int(v) for i, v in opers_raw.items() if str(v).isdigit()}
+
+        # PVID / VLAN mapping (the untagged-bitmap fallback only when the PVID table is empty)
+        pvid_by_base = {base: int(v) for base, v in pvid_raw.items() if str(v).isdigit()}
+        if not pvid_by_base:
+            vlan_untag_raw = await _walk(sess, OID_VLAN_CURR_UNTAG)
+            base_to_vlan = {}
+            for vlan_id, octs in vlan_untag_raw.items():
+                for base_port in _bitmap_ports_msb(_octets(octs)):
+                    base_to_vlan.setdefault(base_port, vlan_id)
+            pvid_by_base = base_to_vlan
+
+        # Choose physical ports (best effort)
+        candidates = sorted(ifnames.items(), key=lambda kv: kv[0])
+        phys = []
+        for ifIndex, name in candidates:
+            n = name.lower()
+            if any(s in n for s in ['eth', 'port', '/']) or n.isdigit():
+                phys.append(ifIndex)
+            if len(phys) >= self.port_count:
+                break
+        if len(phys) < self.port_count:
+            phys = [idx for idx, _ in candidates[:self.port_count]]
+
+        now = time.time()
+        new_state: Dict[int, Dict[str, Any]] = {}
+        port = 1
+        for ifIndex in phys[:self.port_count]:
+            base = _portnum_from_ifname(ifnames.get(ifIndex, ""))
+            vlan = pvid_by_base.get(base) if base is not None else None
+            speed = speeds.get(ifIndex)
+            up = (opers.get(ifIndex) == 1)
+            new_state[port] = {
+                'vlan': vlan,
+                'speed': speed,
+                'up': up,
+                'ifIndex': ifIndex,
+                'ifName': ifnames.get(ifIndex, str(ifIndex)),
+                # wall-clock time each table was last read for this port
+                'seen': {'oper': now, 'table': now},
+            }
+            port += 1
+
+        with self.state_lock:
+            old = {s['ifIndex']: s for s in self.state.values()}
+            for s in new_state.values():
+                prev = old.get(s['ifIndex'])
+                if prev is not None and 'rates' in prev:
+                    s['rates'] = prev['rates']
+                    s['seen']['counters'] = (prev.get('seen') or {}).get('counters')
+            self._set_state(new_state)
+        self._port_by_ifindex = {s['ifIndex']: p for p, s in new_state.items()}
+        self._marks = self._read_marks(marks)
+        self._slow_due = time.monotonic() + self.slow_interval
+        self._slow_port_count = self.port_count
+
+    def _read_marks(self, values):
+        out = {}
+        for oid, key in _CHANGE_MARKERS.items():
+            v = values.get(oid)
             try:
-                temp = await self._read_switch_temp(eng, tgt)
+                out[key] = int(v) if v is not None else None
             except Exception:
-                temp = None
+                out[key] = None
+        out['at'] = time.monotonic()
+        return out
+
+    def _layout_changed(self, marks):
+        """True if the switch rebooted or its interface table changed since the last slow refresh."""
+        old = self._marks or {}
+        if marks['if_number'] != old.get('if_number') or marks['if_last_change'] != old.get('if_last_change'):
+            return True
+        up, prev = marks['uptime'], old.get('uptime')
+        if up is None or prev is None:
+            return up != prev
+        # sysUpTime (centiseconds) only moves forward; going back means the agent restarted
+        return up < prev
+
+    async def _poll_fast(self, sess):
+        """
+        Link-state tier: the change markers and ifOperStatus for the mapped ports.
+        The markers go in their own GET so an agent lacking one (v1 noSuchName)
+        cannot take the link states down with it.
+        """
+        by_idx = self._port_by_ifindex
+        mark_values, values = await asyncio.gather(
+            self._get_many(sess, list(_CHANGE_MARKERS)),
+            self._get_many(sess, [f"{OID_IFOPER}.{i}" for i in by_idx]))
+        if by_idx and not any(f"{OID_IFOPER}.{i}" in values for i in by_idx):
+            raise SnmpError("fast poll returned no ifOperStatus values")
+        marks = self._read_marks(mark_values)
+        if self._layout_changed(marks):
+            return False
+        self._marks = marks
+        now = time.time()
+        with self.state_lock:
+            state = {k: v.copy() for k, v in self.state.items()}
+        for idx, port in by_idx.items():
+            v = values.get(f"{OID_IFOPER}.{idx}")
+            # a trap for this port arrived while the GET was out; its re-poll is newer
+            if v is not None and port in state and idx not in self._repoll:
+                state[port]['up'] = (str(v) == '1')
+                state[port]['seen'] = dict(state[port].get('seen') or {}, oper=now)
+        self._set_state(state)
+        return True
 
+    def _counters_enabled(self):
+        return bool(self.counters_cfg.get('enabled'))
+
+    async def _poll_counters(self, sess):
+        """
+        Octet/error/discard counters for every interface in one multi-column bulk walk.
+        sysUpTime rides in the walk's first PDU (a GET alongside the walk on v1) and is
+        the time base for the rates, so poll jitter does not show up in them.
+        """
+        oids = [COUNTER_COLUMNS[n][0] for n in COUNTER_NAMES]
+        if sess.bulk:
+            scal = {OID_SYS_UPTIME: None}
+            cols = await _bulk_walk(sess, oids, scalars=scal)
+        else:
+            scal, cols = await asyncio.gather(self._get_many(sess, [OID_SYS_UPTIME]), _walk_columns(sess, *oids))
+        by_idx = self._port_by_ifindex
+        samples = {}
+        for name, col in zip(COUNTER_NAMES, cols):
+            for idx, v in col.items():
+                if idx in by_idx:
+                    try:
+                        samples.setdefault(idx, {})[name] = int(v)
+                    except Exception:
+                        pass
+        with self.state_lock:
+            speeds = {s['ifIndex']: s.get('speed') for s in self.state.values()}
+        try:
+            uptime = int(scal[OID_SYS_UPTIME])
+        except Exception:
+            uptime = None   # agent without sysUpTime: local monotonic time
+        rates = self.traffic.update(samples, uptime, speeds)
+        if rates:
             with self.state_lock:
-                self.state = new_state
-                self.switch_temp_c = temp
-        finally:
-            try:
-                eng.transportDispatcher.closeDispatcher()
-            except Exception:
-                pass
+                state = dict(self.state)
+                now = time.time()
+                for idx, r in rates.items():
+                    port = by_idx.get(idx)
+                    if port in state:
+                        s = state[port]
+                        state[port] = dict(s, rates=r, seen=dict(s.get('seen') or {}, counters=now))
+                self._set_state(state)
+        with self.stats_lock:
+            self.stats["counter_polls"] += 1
 
-    def run(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    async def _poll_once_async(self):
+        t0 = time.perf_counter()
+        sess = await self._session()
+        t1 = time.perf_counter()
+        pk0, by0 = sess.counters()
+        tier = 'fast'
+        if (self._marks is None or self._slow_port_count != self.port_count
+                or time.monotonic() >= self._slow_due):
+            tier = 'slow'
+        elif not await self._poll_fast(sess):
+            tier = 'changed'
+        if tier != 'fast':
+            await self._poll_slow(sess)
+        if time.monotonic() >= self._temp_due:
+            self._temp_due = time.monotonic() + self.temp_interval
+            await self._poll_temp(sess)
+        if self._counters_enabled() and time.monotonic() >= self._counters_due:
+            self._counters_due = time.monotonic() + max(1.0, float(self.counters_cfg.get('interval_sec', 5)))
+            await self._poll_counters(sess)
+        pk1, by1 = sess.counters()
+        with self.stats_lock:
+            st = self.stats
+            st["packets_last"] = pk1 - pk0
+            st["bytes_last"] = by1 - by0
+            st["packets_total"] += pk1 - pk0
+            st["bytes_total"] += by1 - by0
+            st["fast_cycles" if tier == 'fast' else "slow_cycles"] += 1
+            if tier == 'changed':
+                st["layout_changes"] += 1
+            st["last_tier"] = tier
+        return t1 - t0, time.perf_counter() - t1
+
+    # ---- Traps ----
+    def _on_trap_link(self, idx, up, t_recv, src=None):
+        with self.stats_lock:
+            self.stats["traps_received"] += 1
+        port = self._port_by_ifindex.get(idx) if idx is not None else None
+        if port is None:
+            with self.stats_lock:
+                self.stats["traps_ignored"] += 1
+            return
+        with self.state_lock:
+            s = self.state.get(port)
+            if s is not None:
+                s = dict(s, up=up, seen=dict(s.get('seen') or {}, oper=time.time()))
+                state = dict(self.state)
+                state[port] = s
+                self._set_state(state)  # publishing wakes the bus listeners (render loop)
+                self._trap_pending.append(t_recv)
+                self._trap_to_state.append((time.monotonic() - t_recv) * 1000.0)
+        with self.stats_lock:
+            self.stats["traps_applied"] += 1
+        # confirm (and pick up the new speed) with a GET of just this interface
+        self._repoll.add(idx)
+        if self._kick is not None:
+            self._kick.set()
+
+    async def _repoll_targets(self, sess, idxs):
+        oids = []
+        for idx in idxs:
+            oids += [f"{OID_IFOPER}.{idx}", f"{OID_IFHSPEED}.{idx}"]
+        values = await self._get_many(sess, oids)
+        with self.state_lock:
+            state = dict(self.state)
+            for idx in idxs:
+                port = self._port_by_ifindex.get(idx)
+                if port not in state:
+                    continue
+                s = dict(state[port])
+                oper = values.get(f"{OID_IFOPER}.{idx}")
+                speed = values.get(f"{OID_IFHSPEED}.{idx}")
+                if oper is not None:
+                    s['up'] = (str(oper) == '1')
+                    s['seen'] = dict(s.get('seen') or {}, oper=time.time())
+                if speed is not None and str(speed).isdigit():
+                    s['speed'] = int(speed)
+                state[port] = s
+            self._set_state(state)
+        with self.stats_lock:
+            self.stats["trap_repolls"] += 1
+
+    # ---- Main loop ----
+    def _record_cycle(self, elapsed_s, setup_s=None, query_s=None, error=None):
+        bucket = bisect.bisect_left(CYCLE_MS_BUCKETS, elapsed_s * 1000.0)
+        with self.stats_lock:
+            st = self.stats
+            st["cycle_ms_hist"][bucket] += 1
+            if error is not None:
+                kind = 'timeout' if isinstance(error, SnmpTimeout) else error.__class__.__name__
+                st["errors"][kind] = st["errors"].get(kind, 0) + 1
+                self._fail_streak += 1
+                st["failures"] += 1
+                st["last_error"] = str(error) or error.__class__.__name__
+                return
+            self._fail_streak = 0
+            self._streak_at_build = 0
+            st["last_ok"] = time.time()
+            st["cycles"] += 1
+            st["setup_ms_last"] = round(setup_s * 1000.0, 3)
+            st["query_ms_last"] = round(query_s * 1000.0, 3)
+            st["setup_ms_total"] += setup_s * 1000.0
+            st["query_ms_total"] += query_s * 1000.0
+
+    def _next_delay(self):
+        """Fast interval while healthy; exponential backoff with jitter while the switch fails."""
+        delay = self.fast_interval
+        if self._fail_streak > 0:
+            cap = min(self.backoff_max, self.fast_interval * (2 ** min(self._fail_streak, 16)))
+            delay = random.uniform(cap / 2.0, cap)
+        with self.stats_lock:
+            self.stats["backoff_sec"] = round(delay, 3) if self._fail_streak else 0.0
+        return delay
+
+    async def _main(self):
+        self._kick = asyncio.Event()
+        next_at = 0.0
         while not self.stop_event.is_set():
+            if self._next_stale_at is not None and time.time() >= self._next_stale_at:
+                with self.state_lock:
+                    self._publish_locked()  # data aged past stale_after without a new poll
+            if self._repoll and self._port_by_ifindex:
+                idxs, self._repoll = sorted(self._repoll), set()
+                try:
+                    await self._repoll_targets(await self._session(), idxs)
+                except Exception:
+                    pass
+            if time.monotonic() >= next_at:
+                t0 = time.perf_counter()
+                try:
+                    setup_s, query_s = await self._poll_once_async()
+                except Exception as e:
+                    self._record_cycle(time.perf_counter() - t0, error=e)
+                else:
+                    self._record_cycle(time.perf_counter() - t0, setup_s, query_s)
+                self.ready.set()
+                next_at = time.monotonic() + self._next_delay()
+            # sleep until the next cycle, a trap, a config change or stop (checked a few times a second)
             try:
-                loop.run_until_complete(self._poll_once_async())
-            except Exception:
+                await asyncio.wait_for(self._kick.wait(), min(0.25, max(0.0, next_at - time.monotonic())))
+            except asyncio.TimeoutError:
                 pass
-            self.stop_event.wait(self.interval)
-        loop.close()
+            self._kick.clear()
+
+    def _close(self):
+        if self._sess is not None:
+            self._sess.close()
+            self._sess = None
 
     async def detect_switch(self):
-        eng = SnmpEngine()
-        tgt = await UdpTransportTarget.create((self.host, 161))
+        # Runs on the caller's event loop, so it gets its own short-lived session
+        sess = await _Session.open(self.host, self.community, self.version,
+                                   max_repetitions=self.max_repetitions)
         try:
             # sysDescr
-            errInd, errStat, errIdx, varBinds = await get_cmd(
-                eng, CommunityData(self.community), tgt, ContextData(),
+            errInd, errStat, errIdx, varBinds = await _request(sess, get_cmd(
+                sess.engine, sess.auth, sess.target, sess.context,
                 ObjectType(ObjectIdentity(OID_SYS_DESCR)),
                 lookupMib=False
-            )
+            ))
             model = ""
             if not errInd and not errStat:
                 for ot in varBinds:
                     model = str(ot[1])
 
             # sysName (true name)
-            errInd2, errStat2, errIdx2, varBinds2 = await get_cmd(
-                eng, CommunityData(self.community), tgt, ContextData(),
+            errInd2, errStat2, errIdx2, varBinds2 = await _request(sess, get_cmd(
+                sess.engine, sess.auth, sess.target, sess.context,
                 ObjectType(ObjectIdentity(OID_SYS_NAME)),
                 lookupMib=False
-            )
+            ))
             sysname = ""
             if not errInd2 and not errStat2:
                 for ot in varBinds2:
                     sysname = str(ot[1])
 
             # Guess port count
-            ifnames_raw = await _walk(eng, tgt, self.community, OID_IFNAME)
+            ifnames_raw = await _walk(sess, OID_IFNAME)
             port_numbers = []
             for s_ in [str(v) for v in ifnames_raw.values()]:
                 n = _portnum_from_ifname(s_)
@@ -252,7 +1063,240 @@ class SnmpPoller(threading.Thread):
             guessed = max(port_numbers) if port_numbers else len(ifnames_raw)
             return model, guessed, sysname
         finally:
+            sess.close()
+
+
+def targets_from_config(cfg):
+    """
+    Switch targets from the config: device.switches (list) or, when that is empty,
+    the single device.switch_host. Each target gets a first_port on the LED chain;
+    by default targets follow each other.
+    """
+    dev = cfg.get('device') or {}
+    snmp = dev.get('snmp') or {}
+    switches = dev.get('switches') or []
+    if not switches:
+        return [{
+            'name': 'switch',
+            'host': dev.get('switch_host', ''),
+            'community': snmp.get('community', 'public'),
+            'version': snmp.get('version', 'v2c'),
+            'first_port': 1,
+            'port_count': int((dev.get('ports') or {}).get('count', 16)),
+        }]
+    out = []
+    next_port = 1
+    for i, s in enumerate(switches):
+        first = int(s.get('first_port') or next_port)
+        count = int(s.get('port_count') or 0)
+        out.append({
+            'name': str(s.get('name') or s.get('host') or f'switch{i + 1}'),
+            'host': s.get('host', ''),
+            'community': s.get('community') or snmp.get('community', 'public'),
+            'version': s.get('version') or snmp.get('version', 'v2c'),
+            'first_port': first,
+            'port_count': count,
+        })
+        next_port = first + count
+    return out
+
+class PollerGroup(threading.Thread):
+    """
+    Several switches on one thread and one event loop. Each target is an
+    SnmpPoller whose main loop runs as its own task (own session, in-flight cap,
+    tiers and stats), so a slow or unreachable switch only delays itself. Port
+    states are merged into one LED port space using each target's first_port.
+    A single trap listener routes notifications by source address.
+    """
+    def __init__(self, targets, stop_event=None, traps=None, **options):
+        super().__init__(daemon=True)
+        self.stop_event = stop_event or threading.Event()
+        self.options = dict(options)   # shared SnmpPoller settings (intervals, counters, ...)
+        self.traps_cfg = dict(traps or {})
+        self.ready = threading.Event()  # set once every target finished its first cycle
+        self._lock = threading.Lock()
+        self._targets = {}             # name -> (SnmpPoller, target dict)
+        self._tasks = {}
+        self.bus = StateBus()          # every target publishes its ports here at first_port offsets
+        self._loop = None
+        self._traps: Optional[_TrapListener] = None
+        self._trap_status = None
+        self._trap_failed = None       # (key, retry_at) after a failed bind
+        self._pending = list(targets)  # applied by the loop thread; swapped under _lock
+
+    # ---- configuration ----
+    def _make(self, t):
+        p = SnmpPoller(host=t['host'], community=t['community'], version=t['version'],
+                       port_count=t['port_count'], stop_event=threading.Event(), bus=self.bus,
+                       port_offset=t['first_port'] - 1, switch_name=t['name'], **self.options)
+        return p
+
+    def _apply_targets(self, targets):
+        """Loop thread: start new targets, reconfigure changed ones, stop removed ones."""
+        wanted = {t['name']: t for t in targets}
+        with self._lock:
+            for name in list(self._targets):
+                if name not in wanted:
+                    poller, _ = self._targets.pop(name)
+                    poller.stop_event.set()
+                    poller._wakeup()
+            for name, t in wanted.items():
+                cur = self._targets.get(name)
+                if cur is None:
+                    poller = self._make(t)
+                    poller._loop = self._loop
+                    self._targets[name] = (poller, t)
+                    self._tasks[name] = self._loop.create_task(self._run_target(poller))
+                else:
+                    cur[0].configure(host=t['host'], community=t['community'], version=t['version'],
+                                     port_count=t['port_count'], **self.options)
+                    cur[0].set_port_offset(t['first_port'] - 1)
+                    self._targets[name] = (cur[0], t)
+
+    def configure(self, targets=None, traps=None, **options):
+        """Thread-safe: shared options apply to every target; `targets` replaces the target list."""
+        opts = {k: v for k, v in options.items() if v is not None}
+        self.options.update(opts)
+        if traps is not None:
+            self.traps_cfg = dict(traps)
+        with self._lock:
+            pollers = [p for p, _ in self._targets.values()]
+            if targets is not None:
+                self._pending = list(targets)
+        if targets is None:
+            for p in pollers:
+                p.configure(**opts)
+
+    def _targets_snapshot(self):
+        with self._lock:
+            return list(self._targets.values())
+
+    # ---- loop ----
+    async def _run_target(self, poller):
+        try:
+            await poller._main()
+        except Exception as e:
+            print(f"[snmp] {poller.name}: poll loop stopped: {e}")
+        finally:
+            poller._close()
+            if poller.stop_event.is_set() and not self.stop_event.is_set():
+                poller._set_state({})  # target removed: drop its ports from the bus
+
+    async def _sync_traps(self):
+        t = self.traps_cfg
+        key = None
+        if t.get('enabled'):
+            targets = self._targets_snapshot()
+            community = t.get('community') or (targets[0][1]['community'] if targets else 'public')
+            key = (t.get('listen') or '0.0.0.0', int(t.get('port') or 162), community)
+        cur = self._traps
+        if (cur.key if cur is not None else None) == key:
+            return
+        failed = self._trap_failed
+        if failed is not None and failed[0] == key and time.monotonic() < failed[1]:
+            return
+        if cur is not None:
+            cur.close()
+            self._traps = None
+        self._trap_status = None
+        self._trap_failed = None
+        if key is not None:
             try:
-                eng.transportDispatcher.closeDispatcher()
-            except Exception:
-                pass
+                self._traps = await _TrapListener.open(self._on_trap, *key)
+                self._trap_status = f"{key[0]}:{key[1]}"
+                print(f"[snmp] trap listener on {self._trap_status}")
+            except Exception as e:
+                self._trap_status = f"error: {e}"
+                self._trap_failed = (key, time.monotonic() + TRAP_RETRY_SEC)
+                print(f"[snmp] trap listener failed on {key[0]}:{key[1]}: {e}")
+
+    def _on_trap(self, idx, up, t_recv, src):
+        targets = self._targets_snapshot()
+        match = [p for p, _ in targets if p.address == src]
+        if not match and len(targets) == 1:
+            match = [targets[0][0]]
+        for p in match:
+            p._on_trap_link(idx, up, t_recv, src)
+
+    async def _main(self):
+        while not self.stop_event.is_set():
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is not None:
+                self._apply_targets(pending)
+            await self._sync_traps()
+            targets = self._targets_snapshot()
+            if all(p.ready.is_set() for p, _ in targets):   # no targets (sync follower): ready
+                self.ready.set()
+            await asyncio.sleep(0.25)
+        for p, _ in self._targets_snapshot():
+            p.stop_event.set()
+            p._wakeup()
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            if self._traps is not None:
+                self._traps.close()
+                self._traps = None
+            for p, _ in self._targets_snapshot():
+                p._close()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    # ---- merged view ----
+    def _lookup(self, port):
+        """Global LED port -> (poller, local port) or (None, None)."""
+        for p, t in self._targets_snapshot():
+            local = port - t['first_port'] + 1
+            if 1 <= local <= t['port_count']:
+                return p, local
+        return None, None
+
+    def get_state(self):
+        """Copy of the merged port state. Prefer bus.snapshot() (no copy) in hot paths."""
+        return {port: dict(s) for port, s in self.bus.snapshot()[1].items()}
+
+    def get_stats(self):
+        per = {}
+        for p, t in self._targets_snapshot():
+            st = p.get_stats()
+            st['host'] = t['host']
+            st['ports'] = [t['first_port'], t['first_port'] + t['port_count'] - 1]
+            per[t['name']] = st
+        return {
+            'cycles': sum(s['cycles'] for s in per.values()),
+            'failures': sum(s['failures'] for s in per.values()),
+            'trap_listener': self._trap_status,
+            'bus': self.bus.get_stats(),
+            'targets': per,
+        }
+
+    def add_listener(self, fn):
+        self.bus.add_listener(fn)
+
+    def frame_shown(self, state_read_at):
+        for p, _ in self._targets_snapshot():
+            p.frame_shown(state_read_at)
+
+    def traffic_history(self, port):
+        p, local = self._lookup(port)
+        if p is None:
+            return []
+        s = self.bus.snapshot()[1].get(port) or {}
+        return p.traffic.history_for(s.get('ifIndex'))
+
+    async def detect_switch(self):
+        """Detect the first target (the single-switch setup flow)."""
+        targets = self._targets_snapshot()
+        if not targets:
+            raise SnmpError("no switch configured")
+        first = min(targets, key=lambda pt: pt[1]['first_port'])[0]
+        return await first.detect_switch()
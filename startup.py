@@ -0,0 +1,64 @@
+import threading, time
+
+class BootTracker:
+    """Per-subsystem readiness and bring-up time for the staged startup (/api/ready)."""
+    def __init__(self):
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = {}
+
+    def begin(self, name):
+        with self._lock:
+            self._started[name] = time.monotonic()
+            self._stages[name] = {
+                "ready": False,
+                "error": None,
+                "started_s": round(time.monotonic() - self._t0, 3),
+                "seconds": None,
+            }
+
+    def done(self, name, error=None):
+        now = time.monotonic()
+        with self._lock:
+            started = self._started.setdefault(name, now)
+            st = self._stages.setdefault(name, {"started_s": round(started - self._t0, 3)})
+            st["ready"] = error is None
+            st["error"] = error
+            st["seconds"] = round(now - started, 3)
+
+    def run(self, name, fn, background=True):
+        """Run fn() as stage `name`, on its own thread unless background=False."""
+        self.begin(name)
+        def _target():
+            try:
+                fn()
+            except Exception as e:
+                self.done(name, error=str(e) or e.__class__.__name__)
+                return
+            self.done(name)
+        if background:
+            threading.Thread(target=_target, daemon=True, name=f"boot-{name}").start()
+        else:
+            _target()
+
+    def watch(self, name, event, timeout=None):
+        """Mark stage `name` ready once a subsystem sets `event` (e.g. after its first poll)."""
+        self.begin(name)
+        def _target():
+            if event.wait(timeout):
+                self.done(name)
+            else:
+                self.done(name, error="timeout")
+        threading.Thread(target=_target, daemon=True, name=f"boot-{name}").start()
+
+    def snapshot(self):
+        with self._lock:
+            stages = {k: dict(v) for k, v in self._stages.items()}
+        return {
+            # ready: every stage finished bring-up; ok: none of them failed
+            "ready": all(s.get("seconds") is not None for s in stages.values()),
+            "ok": all(s.get("ready") for s in stages.values()),
+            "uptime_s": round(time.monotonic() - self._t0, 3),
+            "subsystems": stages,
+        }
@@ -0,0 +1,92 @@
+import threading
+from collections import deque
+
+class StateBus:
+    """
+    In-process change feed for port state. Publishers swap in new per-port dicts
+    (never mutated after publishing) and the bus bumps `version` when a port
+    changed in a way consumers care about. Readers share the published view
+    without copying, skip work when the version is unchanged, fetch only the
+    changed ports with changes_since(), or block in wait().
+    """
+    def __init__(self, history=128):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._view = {}
+        self._log = deque(maxlen=int(history))   # (version, changed ports, removed ports)
+        self._listeners = []
+        self.publishes = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def snapshot(self):
+        """(version, {port: state}); the dict and its port dicts are read-only."""
+        with self._cond:
+            return self._version, self._view
+
+    def publish(self, updates, changed=None, removed=()):
+        """
+        updates: {port: state} to store; changed: the ports among them that count
+        as a change (default: all); removed: ports to drop. Returns the version.
+        Ports stored without being in `changed` refresh silently (e.g. timestamps).
+        """
+        changed = set(updates) if changed is None else set(changed)
+        with self._cond:
+            removed = [p for p in removed if p in self._view]
+            view = dict(self._view)
+            view.update(updates)
+            for p in removed:
+                view.pop(p, None)
+            self._view = view
+            if not changed and not removed:
+                return self._version
+            self._version += 1
+            self._log.append((self._version, frozenset(changed), frozenset(removed)))
+            self.publishes += 1
+            version = self._version
+            self._cond.notify_all()
+        for fn in list(self._listeners):
+            try:
+                fn()
+            except Exception:
+                pass
+        return version
+
+    def changes_since(self, version):
+        """
+        (current version, {port: state} changed since `version`, [removed ports], full).
+        full=True means the history does not cover `version` (too old, negative, or
+        newer than the bus, e.g. kept across a restart) and the whole view is returned.
+        """
+        with self._cond:
+            cur, view = self._version, self._view
+            if version == cur:
+                return cur, {}, [], False
+            if version < 0 or version > cur or not self._log or self._log[0][0] > version + 1:
+                return cur, dict(view), [], True
+            changed, removed = set(), set()
+            for v, c, r in self._log:
+                if v > version:
+                    changed |= c
+                    changed -= r
+                    removed |= r
+                    removed -= c
+            return cur, {p: view[p] for p in changed if p in view}, sorted(removed), False
+
+    def wait(self, version, timeout=None):
+        """
+        Block until the version differs from `version` (or timeout); returns the
+        current version. A `version` from before a restart returns at once.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def add_listener(self, fn):
+        """fn() runs on the publishing thread after every version bump."""
+        self._listeners.append(fn)
+
+    def get_stats(self):
+        return {'version': self._version, 'ports': len(self._view), 'publishes': self.publishes}
@@ -58,6 +58,7 @@ class TempMonitor(threading.Thread):
         self.chip_id = None
         self._cal = None  # (T1, T2, T3)
         self._t_fine = 0
+        self.ready = threading.Event()  # set after the first reading
 
     def stop(self):
         self._stop.set()
@@ -267,4 +268,5 @@ class TempMonitor(threading.Thread):
             with self._lock:
                 self.values["cpu_c"] = cpu
                 self.values["ext_c"] = ext
+            self.ready.set()
             self._stop.wait(2.0)
@@ -0,0 +1,77 @@
+import copy, json, os, sys, time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app_context import AppContext
+
+
+def _ctx(tmp_path, cfg=None):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(cfg or {'vlan_colors': {'1': '#ff0000'}, 'sync': {}}))
+    return AppContext(str(path)), path
+
+
+def test_apply_then_flush_writes_once(tmp_path):
+    ctx, path = _ctx(tmp_path)
+    ctx.apply_cfg({'vlan_colors': {'1': '#00ff00'}}, persist_after=60)
+    ctx.apply_cfg({'vlan_colors': {'1': '#0000ff'}}, persist_after=60)
+    assert json.loads(path.read_text())['vlan_colors'] == {'1': '#ff0000'}
+    assert ctx.flush_cfg() is True
+    assert ctx.flush_cfg() is False
+    st = ctx.get_persist_stats()
+    assert st['writes'] == 1 and not st['pending']
+    assert json.loads(path.read_text())['vlan_colors'] == {'1': '#0000ff'}
+
+
+def test_deferred_write_is_debounced(tmp_path):
+    ctx, path = _ctx(tmp_path)
+    for i in range(4):
+        ctx.apply_cfg({'vlan_colors': {'1': f'#00000{i}'}}, persist_after=0.15)
+        time.sleep(0.05)
+    assert ctx.get_persist_stats()['writes'] == 0
+    time.sleep(0.3)
+    assert ctx.get_persist_stats()['writes'] == 1
+    assert json.loads(path.read_text())['vlan_colors'] == {'1': '#000003'}
+
+
+def test_apply_merges_into_current_config(tmp_path):
+    ctx, _ = _ctx(tmp_path, {'vlan_colors': {}, 'led': {'brightness': 10}})
+    ctx.save_cfg(dict(ctx.get_cfg_snapshot(), led={'brightness': 99}))
+    ctx.apply_cfg({'vlan_colors': {'5': '#123456'}})
+    cfg = ctx.get_cfg()
+    assert cfg['led']['brightness'] == 99
+    assert cfg['vlan_colors']['5'] == '#123456'
+
+
+def test_snapshot_is_read_only(tmp_path):
+    ctx, _ = _ctx(tmp_path)
+    cfg = ctx.get_cfg()
+    with pytest.raises(TypeError):
+        cfg['led'] = {}
+    with pytest.raises(TypeError):
+        cfg['vlan_colors']['2'] = '#000000'
+    with pytest.raises(TypeError):
+        cfg['vlan_colors'].update({'2': '#000000'})
+
+
+def test_generation_increases_on_every_swap(tmp_path):
+    ctx, _ = _ctx(tmp_path)
+    g0 = ctx.cfg_generation
+    snap = ctx.save_cfg(ctx.get_cfg_snapshot())
+    assert snap.generation == g0 + 1 == ctx.get_cfg().generation
+    ctx.apply_cfg({'led': {'brightness': 5}})
+    assert ctx.cfg_generation == g0 + 2
+
+
+def test_snapshot_round_trips_through_json_and_thaws(tmp_path):
+    ctx, _ = _ctx(tmp_path, {'vlan_colors': {'1': '#ff0000'}, 'device': {'switches': [{'host': 'a'}]}})
+    cfg = ctx.get_cfg()
+    assert json.loads(json.dumps(cfg)) == {'vlan_colors': {'1': '#ff0000'}, 'device': {'switches': [{'host': 'a'}]}}
+    copy_ = copy.deepcopy(cfg)
+    copy_['device']['switches'].append({'host': 'b'})   # plain dicts/lists, editable
+    mutable = ctx.get_cfg_snapshot()
+    mutable['vlan_colors']['2'] = '#00ff00'
+    assert '2' not in ctx.get_cfg()['vlan_colors']
+    assert len(ctx.get_cfg()['device']['switches']) == 1
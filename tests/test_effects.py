@@ -0,0 +1,45 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from effects import EffectEngine
+
+
+class _Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_timed_layer_expires_on_local_time_when_clock_snaps():
+    clock = _Clock(1000.0)
+    engine = EffectEngine(clock=clock)
+    fx = engine.start('rainbow', key='boot', duration=1.2)
+    assert not engine.evaluate(clock(), {}, mono=fx.start + 0.5).base
+
+    clock.t -= 600.0    # first sync against a master that is 10 minutes behind
+    out = engine.evaluate(clock(), {}, mono=fx.start + 1.5)
+    assert out.base
+    assert not engine.active('boot')
+
+
+def test_flash_stays_bounded_when_clock_snaps_forward():
+    clock = _Clock(50.0)
+    engine = EffectEngine(clock=clock)
+    fx = engine.start('flash', key='flash:3', ports=[3], period=0.5, pulses=2)
+    clock.t += 3600.0
+    engine.evaluate(clock(), {}, mono=fx.start + 0.4)
+    assert engine.active('flash:3')
+    engine.evaluate(clock(), {}, mono=fx.start + 1.0)
+    assert not engine.active('flash:3')
+
+
+def test_pulse_does_not_animate_in_utilization_mode():
+    engine = EffectEngine(clock=_Clock(10.0))
+    assert engine.evaluate(10.0, {}, leds_pp=2).animating
+    cfg = {'led': {'link_mode': 'utilization'}}
+    assert not engine.evaluate(10.0, cfg, leds_pp=2).animating
+    engine.start('blink', key='b', ports=[1])
+    assert engine.evaluate(10.0, cfg, leds_pp=2).animating
@@ -0,0 +1,40 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from led_driver import LedStrip, _channel_layout
+
+
+def test_split_layout_covering_all_ports():
+    layout = _channel_layout([{'pin': 18, 'ports': [1, 8]}, {'pin': 13, 'ports': [9, 16]}], 16, 2)
+    assert layout == [(18, 0, 16), (13, 16, 16)]
+
+
+def test_overlapping_ranges_fall_back_to_one_chain():
+    assert len(_channel_layout([{'pin': 18, 'ports': [1, 10]}, {'pin': 13, 'ports': [9, 16]}], 16, 2)) == 1
+
+
+def test_gap_falls_back_to_one_chain():
+    assert len(_channel_layout([{'pin': 18, 'ports': [1, 6]}, {'pin': 13, 'ports': [9, 16]}], 16, 2)) == 1
+
+
+def test_range_past_port_count_falls_back_to_one_chain():
+    assert len(_channel_layout([{'pin': 18, 'ports': [1, 8]}, {'pin': 13, 'ports': [9, 24]}], 16, 2)) == 1
+
+
+def test_mock_dual_strip_routes_each_half():
+    strip = LedStrip(4, 1, backend='mock', brightness=255,
+                     channels=[{'pin': 18, 'ports': [1, 2]}, {'pin': 13, 'ports': [3, 4]}])
+    strip.set_port_led(3, 0, (255, 0, 0))
+    strip.show()
+    assert strip.strip.channels[1]._pixels[0][0] > 0
+    assert strip.strip.channels[0]._pixels == [(0, 0, 0, 0)] * 2
+
+
+def test_closed_strip_stops_showing():
+    strip = LedStrip(2, 2, backend='mock')
+    strip.fill((1, 2, 3))
+    assert strip.show()
+    strip.close()
+    strip.fill((4, 5, 6))
+    assert not strip.show()
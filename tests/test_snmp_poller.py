@@ -0,0 +1,119 @@
+import asyncio, os, socket, sys, types
+
+import pytest
+from pyasn1.type.univ import Integer, ObjectIdentifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import snmp_poller
+from snmp_poller import (
+    SnmpError, PollerGroup, _TrapListener, _bulk_walk,
+    OID_IFINDEX, OID_IFOPER, OID_TRAP_LINK_DOWN,
+    SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity,
+)
+
+
+def _session():
+    return types.SimpleNamespace(
+        engine=None, auth=None, target=None, context=None,
+        max_repetitions=10, deadline=1.0, inflight=asyncio.Semaphore(4))
+
+
+def test_bulk_walk_stops_on_repeated_oid(monkeypatch):
+    row = (ObjectIdentifier(OID_IFOPER + '.1'), Integer(1))
+
+    async def bulk_cmd(*args, **kwargs):
+        return None, 0, 0, [row]     # agent keeps answering with the same row
+
+    monkeypatch.setattr(snmp_poller, 'bulk_cmd', bulk_cmd)
+    with pytest.raises(SnmpError, match='not increasing'):
+        asyncio.run(asyncio.wait_for(_bulk_walk(_session(), [OID_IFOPER]), 2.0))
+
+
+def test_bulk_walk_collects_increasing_rows(monkeypatch):
+    pages = [
+        [(ObjectIdentifier(OID_IFOPER + '.1'), Integer(1)), (ObjectIdentifier(OID_IFOPER + '.2'), Integer(2))],
+        [(ObjectIdentifier('1.3.6.1.2.1.2.2.1.9.1'), Integer(0))],
+    ]
+
+    async def bulk_cmd(*args, **kwargs):
+        return None, 0, 0, pages.pop(0)
+
+    monkeypatch.setattr(snmp_poller, 'bulk_cmd', bulk_cmd)
+    out = asyncio.run(_bulk_walk(_session(), [OID_IFOPER]))
+    assert out == [{1: 1, 2: 2}]
+
+
+def _free_udp_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_trap_listener_receives_link_down():
+    from pysnmp.hlapi.v3arch.asyncio import NotificationType, send_notification
+    port = _free_udp_port()
+    got = []
+
+    async def run():
+        done = asyncio.Event()
+
+        def on_link(idx, up, t_recv, src):
+            got.append((idx, up, src))
+            done.set()
+
+        listener = await _TrapListener.open(on_link, '127.0.0.1', port, 'public')
+        sender = SnmpEngine()
+        try:
+            await send_notification(
+                sender, CommunityData('public'),
+                await UdpTransportTarget.create(('127.0.0.1', port), timeout=1, retries=0),
+                ContextData(), 'trap',
+                NotificationType(ObjectIdentity(OID_TRAP_LINK_DOWN)).add_varbinds(
+                    ObjectType(ObjectIdentity(OID_IFINDEX + '.7'), Integer(7)),
+                    ObjectType(ObjectIdentity(OID_IFOPER + '.7'), Integer(2))))
+            await asyncio.wait_for(done.wait(), 5)
+        finally:
+            sender.close_dispatcher()
+            listener.close()
+
+    asyncio.run(run())
+    assert got == [(7, False, '127.0.0.1')]
+
+
+def test_trap_listener_reports_port_in_use():
+    busy = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    busy.bind(('127.0.0.1', 0))
+    port = busy.getsockname()[1]
+    group = PollerGroup([], traps={'enabled': True, 'listen': '127.0.0.1', 'port': port})
+    try:
+        with pytest.raises(OSError):
+            asyncio.run(_TrapListener.open(lambda *a: None, '127.0.0.1', port))
+        asyncio.run(group._sync_traps())
+        assert group._traps is None
+        assert group.get_stats()['trap_listener'].startswith('error:')
+    finally:
+        busy.close()
+
+
+def test_bulk_walk_reads_scalars_from_first_pdu(monkeypatch):
+    from pyasn1.type.univ import Null
+    sent = []
+    uptime = ObjectIdentifier(snmp_poller.OID_SYS_UPTIME)
+    pages = [
+        [(uptime, Integer(4200)), (ObjectIdentifier(OID_IFOPER + '.1'), Integer(1))],
+        [(ObjectIdentifier('1.3.6.1.2.1.2.2.1.9.1'), Null())],
+    ]
+
+    async def bulk_cmd(engine, auth, target, context, non_rep, max_rep, *var_binds, **kwargs):
+        sent.append(non_rep)
+        return None, 0, 0, pages.pop(0)
+
+    monkeypatch.setattr(snmp_poller, 'bulk_cmd', bulk_cmd)
+    scalars = {snmp_poller.OID_SYS_UPTIME: None}
+    out = asyncio.run(_bulk_walk(_session(), [OID_IFOPER], scalars=scalars))
+    assert out == [{1: 1}]
+    assert int(scalars[snmp_poller.OID_SYS_UPTIME]) == 4200
+    assert sent == [1, 0]
@@ -0,0 +1,60 @@
+import os, sys, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from state_bus import StateBus
+
+
+def test_publish_bumps_version_only_for_changes():
+    bus = StateBus()
+    assert bus.publish({1: {'up': True}}) == 1
+    # refresh without a change: stored, but no new version
+    assert bus.publish({1: {'up': True, 'seen': 2}}, changed=()) == 1
+    assert bus.snapshot() == (1, {1: {'up': True, 'seen': 2}})
+    assert bus.publish({}, removed=[9]) == 1     # removing an unknown port is no change
+
+
+def test_snapshot_view_is_replaced_not_mutated():
+    bus = StateBus()
+    bus.publish({1: {'up': True}})
+    _, before = bus.snapshot()
+    bus.publish({2: {'up': False}})
+    assert before == {1: {'up': True}}
+
+
+def test_changes_since_merges_log():
+    bus = StateBus()
+    bus.publish({1: {'up': True}, 2: {'up': True}})
+    v = bus.version
+    bus.publish({1: {'up': False}})
+    bus.publish({}, removed=[2])
+    bus.publish({3: {'up': True}})
+    cur, changed, removed, full = bus.changes_since(v)
+    assert (cur, full) == (4, False)
+    assert changed == {1: {'up': False}, 3: {'up': True}}
+    assert removed == [2]
+    assert bus.changes_since(cur) == (cur, {}, [], False)
+
+
+def test_changes_since_unknown_version_returns_full_view():
+    bus = StateBus(history=2)
+    for i in range(5):
+        bus.publish({i: {'up': True}})
+    assert bus.changes_since(0)[3] is True          # fell out of the history
+    cur, view, _, full = bus.changes_since(99)      # newer than the bus (kept across a restart)
+    assert full and cur == 5 and len(view) == 5
+
+
+def test_wait_wakes_on_publish_and_listeners_run():
+    bus = StateBus()
+    calls = []
+    bus.add_listener(lambda: calls.append(bus.version))
+    pub = threading.Timer(0.05, bus.publish, args=({1: {'up': True}},))
+    pub.start()
+    t0 = time.monotonic()
+    assert bus.wait(0, timeout=2) == 1
+    assert time.monotonic() - t0 < 1
+    pub.join()
+    assert calls == [1]
+    assert bus.wait(1, timeout=0.05) == 1           # times out without a change
+    assert bus.wait(7, timeout=2) == 1              # stale version returns at once
@@ -0,0 +1,67 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from traffic import RateRing, TrafficTracker, counter_delta, util_level
+
+
+def test_counter_delta_wraps_once():
+    assert counter_delta(10, 4, 32) == 6
+    assert counter_delta(5, (1 << 32) - 5, 32) == 10
+
+
+def test_rates_use_uptime_as_time_base():
+    tr = TrafficTracker()
+    assert tr.update({1: {'in_octets': 0, 'out_octets': 0}}, uptime_cs=1000, speeds={1: 1000}, now=0.0) == {}
+    # 2 s of sysUpTime, however late the poll landed locally
+    rates = tr.update({1: {'in_octets': 250_000, 'out_octets': 125_000}}, uptime_cs=1200,
+                      speeds={1: 1000}, now=7.0)
+    assert rates[1]['in_bps'] == 1_000_000.0
+    assert rates[1]['out_bps'] == 500_000.0
+    assert rates[1]['util'] == 0.001
+
+
+def test_32bit_counter_wrap_is_a_rate():
+    tr = TrafficTracker()
+    tr.update({1: {'in_errors': (1 << 32) - 2}}, uptime_cs=0)
+    rates = tr.update({1: {'in_errors': 2}}, uptime_cs=100)
+    assert rates[1]['errors_ps'] == 4.0
+    assert tr.wraps == 1
+
+
+def test_64bit_drop_is_a_clear_not_a_wrap():
+    tr = TrafficTracker()
+    tr.update({1: {'in_octets': 10 ** 12}}, uptime_cs=0, speeds={1: 1000})
+    assert tr.update({1: {'in_octets': 100}}, uptime_cs=100, speeds={1: 1000}) == {}
+    assert tr.cleared == 1 and tr.wraps == 0
+    # the cleared reading is the new baseline
+    rates = tr.update({1: {'in_octets': 1100}}, uptime_cs=200, speeds={1: 1000})
+    assert rates[1]['in_bps'] == 8000.0
+
+
+def test_uptime_going_back_drops_baselines():
+    tr = TrafficTracker()
+    tr.update({1: {'in_octets': 5000}}, uptime_cs=10_000)
+    assert tr.update({1: {'in_octets': 6000}}, uptime_cs=50) == {}
+    assert tr.resets == 1
+    assert 1 in tr.update({1: {'in_octets': 7000}}, uptime_cs=150)
+
+
+def test_implausible_rate_is_discarded():
+    tr = TrafficTracker()
+    tr.update({1: {'in_octets': 0}}, uptime_cs=0, speeds={1: 10})
+    assert tr.update({1: {'in_octets': 10 ** 9}}, uptime_cs=100, speeds={1: 10}) == {}
+    assert tr.discarded == 1
+
+
+def test_rate_ring_keeps_newest_oldest_first():
+    ring = RateRing(3)
+    for i in range(5):
+        ring.push(float(i), i * 10.0, i * 20.0)
+    assert ring.items() == [(2.0, 20.0, 40.0), (3.0, 30.0, 60.0), (4.0, 40.0, 80.0)]
+
+
+def test_util_level_log_scale():
+    assert util_level(None, 0.1) == 0.1
+    assert util_level(1.0, 0.1) == 1.0
+    assert 0.1 < util_level(0.01, 0.1) < 1.0
@@ -0,0 +1,106 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from state_bus import StateBus
+from udp_sync import (
+    UdpSync, MAX_DATAGRAM, MSG_COLORS, MSG_HEARTBEAT, MSG_PORTS, MSG_PORTS_FULL, MSG_PORTS_RESYNC,
+    MSG_RESYNC, config_hash, decode_colors, decode_ports, encode_colors, encode_port, pack_messages,
+    unpack_message,
+)
+
+SLAVE = {'sync': {'mode': 'slave', 'multicast': '239.0.0.1', 'port': 5000}}
+ADDR = ('10.0.0.2', 5000)
+
+
+def _slave(cfg=SLAVE, bus=None):
+    sync = UdpSync(lambda: cfg, bus=bus)
+    sync.applied = []
+    sync._apply = sync.applied.append
+    return sync
+
+
+def _big_colors():
+    return {str(v): '#%06x' % (v * 4099 & 0xFFFFFF) for v in range(1, 700)}
+
+
+def test_resent_fragmented_map_counts_one_duplicate():
+    body = encode_colors(_big_colors())
+    packets = pack_messages(MSG_COLORS, 7, 1, config_hash(body), body)
+    assert len(packets) >= 3
+    sync = _slave()
+    for p in packets:
+        sync._handle(p, ADDR)
+    assert len(sync.applied) == 1
+    for p in packets:
+        sync._handle(p, ADDR)
+    assert sync.stats['duplicates'] == 1
+    assert len(sync.applied) == 1
+
+
+def test_colors_round_trip_sorted_and_skip_bad_keys():
+    body = encode_colors({'20': '#00ff00', '3': '#FF0000', 'x': '#000000'})
+    assert decode_colors(body) == {'3': '#ff0000', '20': '#00ff00'}
+    assert body == encode_colors({'3': '#ff0000', '20': '#00ff00'})   # order-independent, so hashes match
+
+
+def test_fragments_fit_datagram_and_reassemble_out_of_order():
+    colors = _big_colors()
+    body = encode_colors(colors)
+    packets = pack_messages(MSG_COLORS, 1, 5, config_hash(body), body)
+    assert all(len(p) <= MAX_DATAGRAM for p in packets)
+    msgs = [unpack_message(p) for p in packets]
+    assert [m[4] for m in msgs] == list(range(len(packets)))
+    sync = _slave()
+    for p in reversed(packets):
+        sync._handle(p, ADDR)
+    assert sync.applied == [colors]
+
+
+def test_unpack_rejects_foreign_datagrams():
+    good = pack_messages(MSG_HEARTBEAT, 1, 1, 0)[0]
+    assert unpack_message(good)[:3] == (MSG_HEARTBEAT, 1, 1)
+    assert unpack_message(b'XX' + good[2:]) is None
+    assert unpack_message(good[:5]) is None
+
+
+def test_hash_mismatch_is_not_applied():
+    body = encode_colors({'10': '#0077ff'})
+    sync = _slave()
+    sync._handle(pack_messages(MSG_COLORS, 1, 1, config_hash(body) ^ 1, body)[0], ADDR)
+    assert sync.applied == []
+    assert sync.stats['hash_mismatch'] == 1
+
+
+def test_heartbeat_ahead_of_slave_requests_resync():
+    sync = _slave()
+    sent = []
+    sync._send = lambda data, maddr, port: sent.append(unpack_message(data)[0])
+    sync._handle(pack_messages(MSG_HEARTBEAT, 1, 3, 1234)[0], ADDR)
+    assert sent == [MSG_RESYNC]
+
+
+def test_ports_encode_decode():
+    state = {'vlan': 20, 'speed': 1000, 'up': True, 'stale': False, 'ifName': 'Port 4',
+             'rates': {'in_bps': 1000.0, 'out_bps': 0.0, 'errors_ps': 0.0, 'discards_ps': 0.0, 'util': None}}
+    down = {'vlan': None, 'speed': None, 'up': False, 'stale': True, 'ifName': ''}
+    body = b''.join([encode_port(4, state), encode_port(5, down), encode_port(6, None)])
+    assert decode_ports(body) == {4: state, 5: down, 6: None}
+
+
+def test_port_delta_gap_requests_full_snapshot():
+    bus = StateBus()
+    sync = _slave({'sync': dict(SLAVE['sync'], port_state=True)}, bus=bus)
+    sent = []
+    sync._send = lambda data, maddr, port: sent.append(unpack_message(data)[0])
+    up = {'vlan': 1, 'speed': 100, 'up': True, 'stale': False, 'ifName': 'p1'}
+    sync._handle(pack_messages(MSG_PORTS_FULL, 9, 10, 0, [encode_port(1, up)])[0], ADDR)
+    assert bus.snapshot()[1] == {1: up}
+    # in order: applied as a delta
+    sync._handle(pack_messages(MSG_PORTS, 9, 11, 10, [encode_port(1, dict(up, up=False))])[0], ADDR)
+    assert bus.snapshot()[1][1]['up'] is False
+    # 12 went missing: 13 (based on 12) is dropped and a resync is asked for
+    sync._handle(pack_messages(MSG_PORTS, 9, 13, 12, [encode_port(2, up)])[0], ADDR)
+    assert 2 not in bus.snapshot()[1]
+    assert sync.stats['port_gaps'] == 1
+    assert sent == [MSG_PORTS_RESYNC]
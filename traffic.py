@@ -0,0 +1,161 @@
+import math, threading, time
+from array import array
+
+# name -> (column OID, counter width in bits)
+COUNTER_COLUMNS = {
+    'in_octets':    ('1.3.6.1.2.1.31.1.1.1.6', 64),   # ifHCInOctets
+    'out_octets':   ('1.3.6.1.2.1.31.1.1.1.10', 64),  # ifHCOutOctets
+    'in_errors':    ('1.3.6.1.2.1.2.2.1.14', 32),
+    'out_errors':   ('1.3.6.1.2.1.2.2.1.20', 32),
+    'in_discards':  ('1.3.6.1.2.1.2.2.1.13', 32),
+    'out_discards': ('1.3.6.1.2.1.2.2.1.19', 32),
+}
+COUNTER_NAMES = tuple(COUNTER_COLUMNS)
+
+# A delta implying more than this many times the interface speed is a counter
+# reset (e.g. cleared by an admin), not traffic.
+_MAX_RATE_OVER_SPEED = 2.0
+# Without a known speed (down ports report 0), anything above this is not traffic either.
+_MAX_RATE_UNKNOWN_SPEED = 800e9
+
+def counter_delta(new, old, bits):
+    """Delta between two counter readings, allowing for one wrap at 2**bits."""
+    if new >= old:
+        return new - old
+    return new + (1 << bits) - old
+
+class RateRing:
+    """Fixed-size history of (t, in_bps, out_bps) for one port, stored in flat arrays."""
+    __slots__ = ('t', 'rx', 'tx', 'pos', 'count')
+
+    def __init__(self, size):
+        size = max(2, int(size))
+        self.t = array('d', bytes(8 * size))
+        self.rx = array('f', bytes(4 * size))
+        self.tx = array('f', bytes(4 * size))
+        self.pos = 0
+        self.count = 0
+
+    def push(self, t, rx, tx):
+        i = self.pos
+        self.t[i], self.rx[i], self.tx[i] = t, rx, tx
+        self.pos = (i + 1) % len(self.t)
+        self.count = min(self.count + 1, len(self.t))
+
+    def items(self):
+        """Oldest first: [(t, in_bps, out_bps), ...]."""
+        n, size = self.count, len(self.t)
+        start = (self.pos - n) % size
+        out = []
+        for k in range(n):
+            i = (start + k) % size
+            out.append((round(self.t[i], 3), round(self.rx[i], 1), round(self.tx[i], 1)))
+        return out
+
+class TrafficTracker:
+    """
+    Turns raw counter samples into per-interface rates. The time base is sysUpTime
+    when the agent reports it (so poll jitter does not skew rates); a sysUpTime that
+    goes backwards means the agent restarted and every baseline is dropped.
+    """
+    def __init__(self, history=120):
+        self.history = max(2, int(history))
+        self._lock = threading.Lock()
+        self._last = {}      # ifIndex -> (t, {name: value})
+        self._rates = {}     # ifIndex -> latest rates dict
+        self._rings = {}     # ifIndex -> RateRing
+        self._uptime = None
+        self.resets = 0
+        self.wraps = 0
+        self.cleared = 0
+        self.discarded = 0
+
+    def reset(self):
+        with self._lock:
+            self._last.clear()
+            self.resets += 1
+
+    def update(self, samples, uptime_cs=None, speeds=None, now=None):
+        """
+        samples: {ifIndex: {counter name: int}}, uptime_cs: sysUpTime in centiseconds,
+        speeds: {ifIndex: Mbit/s} for the utilisation figure and reset detection.
+        Returns {ifIndex: rates} for interfaces that have a previous sample.
+        """
+        now = time.monotonic() if now is None else now
+        speeds = speeds or {}
+        with self._lock:
+            if uptime_cs is not None and self._uptime is not None and uptime_cs < self._uptime:
+                self._last.clear()
+                self.resets += 1
+            t = (uptime_cs / 100.0) if uptime_cs is not None else now
+            self._uptime = uptime_cs
+            out = {}
+            for idx, vals in samples.items():
+                prev = self._last.get(idx)
+                self._last[idx] = (t, vals)
+                if prev is None:
+                    continue
+                dt = t - prev[0]
+                if dt <= 0:
+                    continue
+                rate = {}
+                cleared = False
+                for name, v in vals.items():
+                    old = prev[1].get(name)
+                    if old is None:
+                        continue
+                    bits = COUNTER_COLUMNS[name][1]
+                    if v < old:
+                        if bits == 64:
+                            # a 64-bit counter does not wrap in practice: it was cleared
+                            cleared = True
+                            break
+                        self.wraps += 1
+                    rate[name] = counter_delta(v, old, bits) / dt
+                if cleared:
+                    self.cleared += 1
+                    continue
+                rx = rate.get('in_octets', 0.0) * 8.0
+                tx = rate.get('out_octets', 0.0) * 8.0
+                speed_bps = (speeds.get(idx) or 0) * 1e6
+                limit = speed_bps * _MAX_RATE_OVER_SPEED if speed_bps else _MAX_RATE_UNKNOWN_SPEED
+                if max(rx, tx) > limit:
+                    # counters were cleared or the interface was replaced: rebaseline
+                    self.discarded += 1
+                    continue
+                r = {
+                    'in_bps': round(rx, 1),
+                    'out_bps': round(tx, 1),
+                    'errors_ps': round(rate.get('in_errors', 0.0) + rate.get('out_errors', 0.0), 3),
+                    'discards_ps': round(rate.get('in_discards', 0.0) + rate.get('out_discards', 0.0), 3),
+                    'util': round(min(1.0, max(rx, tx) / speed_bps), 4) if speed_bps else None,
+                }
+                ring = self._rings.get(idx)
+                if ring is None:
+                    ring = self._rings[idx] = RateRing(self.history)
+                ring.push(time.time(), rx, tx)
+                self._rates[idx] = r
+                out[idx] = r
+            return out
+
+    def rates(self, idx):
+        with self._lock:
+            r = self._rates.get(idx)
+            return dict(r) if r is not None else None
+
+    def history_for(self, idx):
+        with self._lock:
+            ring = self._rings.get(idx)
+            return ring.items() if ring is not None else []
+
+    def get_stats(self):
+        with self._lock:
+            return {'interfaces': len(self._last), 'resets': self.resets,
+                    'wraps': self.wraps, 'cleared': self.cleared, 'discarded': self.discarded}
+
+def util_level(util, floor=0.1):
+    """Utilisation (0..1) -> LED level on a log scale: 0.01% ≈ floor, 100% = 1.0."""
+    if not util or util <= 0:
+        return floor
+    x = (math.log10(max(util, 1e-4)) + 4.0) / 4.0
+    return floor + (1.0 - floor) * min(1.0, max(0.0, x))
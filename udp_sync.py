@@ -1,51 +1,710 @@
-import socket, struct, json, threading, time
+import asyncio, socket, struct, json, threading, time, os, zlib, math
+
+# ---- Wire format ----
+# Every datagram starts with a fixed header:
+#   magic 'EL', format version, message type, sender epoch (random per master
+#   start), sequence number, aux (colours: crc32 of the encoded map; port
+#   deltas: the state version the delta applies on top of), fragment index,
+#   fragment count.
+# A colour map is a sorted run of (vlan id, r, g, b) entries; port state is a
+# run of variable-length port entries. Bodies larger than one datagram are
+# split on entry boundaries and reassembled by the receiver.
+MAGIC = b'EL'
+PROTO_VERSION = 1
+HEADER = struct.Struct('!2sBBIIIBB')
+ENTRY = struct.Struct('!HBBB')
+
+MSG_COLORS = 1      # full vlan_colors map (possibly fragmented), sent when it changes
+MSG_HEARTBEAT = 2   # header only: current seq + hash, so receivers notice what they missed
+MSG_RESYNC = 3      # receiver -> master: please resend the full map
+MSG_PORTS = 4       # port state changes since version `aux` (seq = new state version)
+MSG_PORTS_FULL = 5  # every port (seq = state version); periodic, and the answer to MSG_PORTS_RESYNC
+MSG_PORTS_RESYNC = 6
+MSG_TIME_REQ = 7    # follower -> master: epoch = follower id, body = TIME(t1 follower monotonic, 0)
+MSG_TIME_RESP = 8   # master -> group: same epoch/seq, body = TIME(t1 echoed, t2 master clock)
+TIME = struct.Struct('!dd')
+
+# port entry: port, flags, vlan, speed (Mbit/s), ifName length; then the name,
+# then RATES when F_RATES is set
+PORT = struct.Struct('!HBHIB')
+RATES = struct.Struct('!fffff')     # in_bps, out_bps, errors_ps, discards_ps, util (NaN = unknown)
+F_UP, F_STALE, F_VLAN, F_SPEED, F_RATES, F_GONE = 1, 2, 4, 8, 16, 32
+
+MAX_DATAGRAM = 1200                     # stays below a typical 1500-byte MTU
+MAX_FRAGMENTS = 255
+FRAG_TIMEOUT = 3.0                      # drop incomplete maps after this long
+MAX_PENDING = 8
+RESYNC_MIN_GAP = 1.0                    # rate limit for resync requests and answers
+DEFAULT_HEARTBEAT = 1.0
+DEFAULT_PERSIST_DELAY = 30.0            # slaves: coalesce received maps into one SD-card write
+DEFAULT_PORT_SNAPSHOT = 5.0             # full port snapshot interval (also the feed's keepalive)
+DEFAULT_PORT_STALE = 15.0               # followers flag every port stale after this long without data
+DEFAULT_TIME_INTERVAL = 2.0             # follower clock exchange rate
+DEFAULT_TTL = 2
+
+def _rgb(hx):
+    h = str(hx).lstrip('#')
+    try:
+        return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+    except Exception:
+        return 16, 16, 16
+
+def encode_colors(vlan_colors):
+    """{'10': '#0077FF', ...} -> compact sorted entries. Non-numeric VLAN keys are skipped."""
+    entries = []
+    for k, hx in (vlan_colors or {}).items():
+        try:
+            vid = int(k)
+        except Exception:
+            continue
+        if 0 <= vid <= 0xFFFF:
+            entries.append((vid,) + _rgb(hx))
+    entries.sort()
+    return b''.join(ENTRY.pack(*e) for e in entries)
+
+def decode_colors(body):
+    out = {}
+    for off in range(0, len(body) - len(body) % ENTRY.size, ENTRY.size):
+        vid, r, g, b = ENTRY.unpack_from(body, off)
+        out[str(vid)] = '#%02x%02x%02x' % (r, g, b)
+    return out
+
+def config_hash(body):
+    return zlib.crc32(body) & 0xFFFFFFFF
+
+def _f(v):
+    return float('nan') if v is None else float(v)
+
+def encode_port(port, s):
+    """One port's state (vlan, speed, up, stale, ifName, rates); s=None marks the port as gone."""
+    if s is None:
+        return PORT.pack(port, F_GONE, 0, 0, 0)
+    vlan, speed, rates = s.get('vlan'), s.get('speed'), s.get('rates')
+    flags = ((F_UP if s.get('up') else 0) | (F_STALE if s.get('stale') else 0) |
+             (F_VLAN if vlan is not None else 0) | (F_SPEED if speed is not None else 0) |
+             (F_RATES if rates else 0))
+    name = str(s.get('ifName') or '').encode('utf-8')[:64]
+    out = PORT.pack(port, flags, int(vlan or 0) & 0xFFFF, min(int(speed or 0), 0xFFFFFFFF), len(name)) + name
+    if rates:
+        out += RATES.pack(_f(rates.get('in_bps')), _f(rates.get('out_bps')), _f(rates.get('errors_ps')),
+                          _f(rates.get('discards_ps')), _f(rates.get('util')))
+    return out
+
+def decode_ports(body):
+    """{port: state, or None for a removed port}."""
+    out, off = {}, 0
+    while off + PORT.size <= len(body):
+        port, flags, vlan, speed, n = PORT.unpack_from(body, off)
+        off += PORT.size
+        name = body[off:off + n].decode('utf-8', 'replace'); off += n
+        if flags & F_GONE:
+            out[port] = None
+            continue
+        s = {'vlan': vlan if flags & F_VLAN else None, 'speed': speed if flags & F_SPEED else None,
+             'up': bool(flags & F_UP), 'stale': bool(flags & F_STALE), 'ifName': name}
+        if flags & F_RATES:
+            vals = RATES.unpack_from(body, off); off += RATES.size
+            r = dict(zip(('in_bps', 'out_bps', 'errors_ps', 'discards_ps', 'util'),
+                         (None if math.isnan(v) else round(v, 4) for v in vals)))
+            s['rates'] = r
+        out[port] = s
+    return out
+
+def follows_ports(cfg):
+    """True when this Pi takes its port state from the master's feed instead of polling."""
+    sc = cfg.get('sync') or {}
+    return sc.get('mode') == 'slave' and bool(sc.get('port_state'))
+
+def pack_messages(mtype, epoch, seq, aux, body=b''):
+    """
+    Header + body, fragmented to fit MAX_DATAGRAM. body is either bytes of
+    fixed-size colour entries or a list of encoded port entries (never split).
+    """
+    room = MAX_DATAGRAM - HEADER.size
+    if isinstance(body, (bytes, bytearray)):
+        step = room // ENTRY.size * ENTRY.size
+        chunks = [body[i:i + step] for i in range(0, len(body), step)] or [b'']
+    else:
+        chunks, cur = [], b''
+        for e in body:
+            if cur and len(cur) + len(e) > room:
+                chunks.append(cur)
+                cur = b''
+            cur += e
+        chunks.append(cur)
+    if len(chunks) > MAX_FRAGMENTS:
+        raise ValueError(f"message too large to sync ({sum(map(len, chunks))} bytes)")
+    n = len(chunks)
+    return [HEADER.pack(MAGIC, PROTO_VERSION, mtype, epoch, seq, aux, i, n) + c
+            for i, c in enumerate(chunks)]
+
+def unpack_message(data):
+    """(type, epoch, seq, aux, frag, nfrag, body) or None for foreign/garbled datagrams."""
+    if len(data) < HEADER.size:
+        return None
+    magic, ver, mtype, epoch, seq, aux, frag, nfrag = HEADER.unpack_from(data)
+    if magic != MAGIC or ver != PROTO_VERSION or nfrag == 0 or frag >= nfrag:
+        return None
+    return mtype, epoch, seq, aux, frag, nfrag, data[HEADER.size:]
+
+class _Reassembly:
+    """Collects the fragments of one map per (sender, epoch, seq); incomplete sets expire."""
+    def __init__(self):
+        self._pending = {}
+        self.expired = 0
+
+    def add(self, key, frag, nfrag, body, now):
+        for k in [k for k, p in self._pending.items() if now - p['t'] > FRAG_TIMEOUT]:
+            del self._pending[k]
+            self.expired += 1
+        p = self._pending.get(key)
+        if p is None or p['n'] != nfrag:
+            if len(self._pending) >= MAX_PENDING:
+                oldest = min(self._pending, key=lambda k: self._pending[k]['t'])
+                del self._pending[oldest]
+                self.expired += 1
+            p = self._pending[key] = {'n': nfrag, 'parts': {}, 't': now}
+        p['parts'][frag] = body
+        if len(p['parts']) < nfrag:
+            return None
+        del self._pending[key]
+        return b''.join(p['parts'][i] for i in range(nfrag))
+
+class SharedClock:
+    """
+    Animation time. Standalone and on the master this is time.time(); a sync
+    slave feeds it (master time, round trip) samples and then runs on the
+    master's clock, counted from its own monotonic clock so local clock steps
+    do not matter. The offset is taken from the lowest-RTT sample of the last
+    WINDOW exchanges and approached gradually so animations never jump.
+    """
+    WINDOW = 8
+    ALPHA = 0.2             # smoothing toward each new best estimate
+    SNAP_SEC = 0.5          # estimates further off than this are taken at once (master restart, first sync)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offset = None     # shared time - time.monotonic()
+        self._samples = []      # [(rtt, offset)]
+        self.stats = {'samples': 0, 'snaps': 0, 'rtt_ms': None, 'jitter_ms': None}
+
+    def now(self):
+        off = self._offset
+        if off is None:
+            return time.time()
+        return time.monotonic() + off
+
+    @property
+    def synced(self):
+        return self._offset is not None
+
+    def reset(self):
+        with self._lock:
+            self._offset = None
+            self._samples = []
+
+    def sample(self, t1, t2, t3):
+        """t1/t3: local monotonic send/receive time of an exchange, t2: master time in between."""
+        rtt = t3 - t1
+        if rtt < 0:
+            return
+        est = t2 - (t1 + t3) / 2.0
+        with self._lock:
+            self._samples = (self._samples + [(rtt, est)])[-self.WINDOW:]
+            best = min(self._samples)[1]
+            cur = self._offset
+            st = self.stats
+            st['samples'] += 1
+            st['rtt_ms'] = round(rtt * 1000.0, 3)
+            if cur is None or abs(best - cur) > self.SNAP_SEC:
+                self._offset = best
+                st['snaps'] += 1
+            else:
+                self._offset = cur + self.ALPHA * (best - cur)
+                dev = abs(est - self._offset) * 1000.0
+                j = st['jitter_ms']
+                st['jitter_ms'] = round(dev if j is None else j + 0.1 * (dev - j), 3)
+
+    def get_stats(self):
+        with self._lock:
+            out = dict(self.stats)
+            off = self._offset
+        out['synced'] = off is not None
+        # shared clock minus this Pi's wall clock
+        out['offset_ms'] = None if off is None else round((time.monotonic() + off - time.time()) * 1000.0, 3)
+        return out
+
+def open_multicast_socket(maddr, port, ttl=DEFAULT_TTL, interface=None):
+    """One UDP socket joined to `maddr` for both receiving and sending (non-blocking)."""
+    iface = socket.inet_aton(interface or '0.0.0.0')
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(('', int(port)))
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(maddr) + iface)
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, int(ttl))
+        if interface:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, iface)
+        s.setblocking(False)
+    except Exception:
+        s.close()
+        raise
+    return s
+
+class _SyncProtocol(asyncio.DatagramProtocol):
+    def __init__(self, owner):
+        self.owner = owner
+
+    def datagram_received(self, data, addr):
+        self.owner._on_datagram(data, addr, time.monotonic())
+
+    def error_received(self, exc):
+        self.owner._count(socket_errors=1)
+
 class UdpSync:
-    def __init__(self, cfg_provider):
+    """
+    Multicast VLAN colour sync. The master sends the full map only when it
+    changes (new sequence number) plus a small heartbeat every
+    sync.heartbeat_sec; slaves apply only newer sequence numbers and ask for a
+    resend when a heartbeat shows they missed one.
+
+    With sync.port_state the master also fans out its port state from `bus`
+    (deltas on every version bump, full snapshots periodically) and slaves
+    publish the feed into their own `bus` instead of polling the switch.
+
+    Slaves also time their exchanges with the master to keep `clock` (a
+    SharedClock driving the animations) on the master's time.
+
+    Everything runs on one asyncio loop in one thread around a single
+    multicast socket (sync.ttl, sync.interface), which only wakes for
+    incoming datagrams, scheduled sends, kick() or a port-state change.
+    """
+    def __init__(self, cfg_provider, bus=None, clock=None):
         self.cfg_provider = cfg_provider
-        self._stop = threading.Event()
-        self._thread_tx = None
-        self._thread_rx = None
-        self._sock_rx = None
+        self.bus = bus
+        self.clock = clock if clock is not None else SharedClock()
+        self._thread = None
+        self._loop = None
+        self._stopping = False
+        self._kick = None               # asyncio.Event on the sync loop
+        self._transport = None
+        self._sock_key = None           # (multicast, port, ttl, interface) of the open socket
+        self._sock_error = None
+        # master side
+        self.epoch = struct.unpack('!I', os.urandom(4))[0]
+        self._seq = 0
+        self._body = None
+        self._hash = 0
+        self._gen = None
+        self._resend = False
+        self._last_resend = 0.0
+        self._ports_ver = None          # state version the followers were last sent
+        self._ports_full = False
+        self._ports_snap_due = 0.0
+        self._last_ports_resend = 0.0
+        # slave side
+        self._rx = {'epoch': None, 'seq': 0, 'hash': None}
+        self._last_resync = 0.0
+        self._pf = {'epoch': None, 'ver': 0, 'at': None, 'stale': False, 'ports': set()}
+        self._last_ports_resync = 0.0
+        self._time_seq = 0
+        self._time_due = 0.0
+        self._frags = _Reassembly()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'tx_full': 0, 'tx_heartbeats': 0, 'tx_resync': 0, 'tx_packets': 0, 'tx_bytes': 0,
+            'rx_packets': 0, 'rx_bytes': 0, 'rx_bad': 0, 'rx_legacy': 0,
+            'applied': 0, 'unchanged': 0, 'duplicates': 0, 'out_of_order': 0, 'hash_mismatch': 0,
+            'resync_requests': 0, 'errors': 0,
+            'tx_port_deltas': 0, 'tx_port_snapshots': 0, 'rx_port_deltas': 0, 'rx_port_snapshots': 0,
+            'port_gaps': 0, 'port_duplicates': 0, 'port_resync_requests': 0, 'port_feed_stale': 0,
+            'time_requests': 0, 'time_replies': 0,
+            'socket_opens': 0, 'socket_errors': 0,
+        }
+
     def start(self):
-        cfg = self.cfg_provider()
-        maddr = cfg['sync']['multicast']; port = int(cfg['sync']['port'])
-        self._sock_rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self._sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        try: self._sock_rx.bind(('', port))
-        except Exception: pass
-        mreq = struct.pack("=4sl", socket.inet_aton(maddr), socket.INADDR_ANY)
-        try: self._sock_rx.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-        except Exception: pass
-        self._thread_rx = threading.Thread(target=self._rx_loop, daemon=True); self._thread_rx.start()
-        self._thread_tx = threading.Thread(target=self._tx_loop, daemon=True); self._thread_tx.start()
-    def stop(self): self._stop.set()
-    def _tx_loop(self):
-        while not self._stop.is_set():
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True, name='udp-sync')
+        self._thread.start()
+        ready.wait(5)
+        if self.bus is not None:
+            self.bus.add_listener(self.kick)    # master: port changes go out right away
+
+    def stop(self):
+        self._stopping = True
+        self.kick()
+
+    def kick(self):
+        """Thread-safe wake-up, e.g. after a config change, so the master sends now instead of at the next heartbeat."""
+        loop, ev = self._loop, self._kick
+        if loop is not None and ev is not None:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                pass   # loop already closed
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._kick = asyncio.Event()
+        ready.set()
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            self._close_socket()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    async def _ensure_socket(self, sc):
+        """(Re)open the multicast socket when its settings change; False while it cannot be opened."""
+        key = (sc.get('multicast'), int(sc.get('port') or 0), int(sc.get('ttl', DEFAULT_TTL)),
+               sc.get('interface') or '')
+        if key == self._sock_key and self._transport is not None:
+            return True
+        if key == self._sock_key and self._sock_error is not None:
+            return False    # same settings failed before; wait for a config change
+        self._close_socket()
+        self._sock_key = key
+        try:
+            sock = open_multicast_socket(key[0], key[1], key[2], key[3] or None)
+            self._transport, _ = await self._loop.create_datagram_endpoint(lambda: _SyncProtocol(self), sock=sock)
+            self._sock_error = None
+            self._count(socket_opens=1)
+            return True
+        except Exception as e:
+            self._sock_error = str(e)
+            self._count(socket_errors=1)
+            print(f"[sync] cannot open {key[0]}:{key[1]}: {e}")
+            return False
+
+    def _close_socket(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _count(self, **inc):
+        with self._stats_lock:
+            for k, v in inc.items():
+                self.stats[k] = self.stats.get(k, 0) + v
+
+    def get_stats(self):
+        cfg = self.cfg_provider().get('sync') or {}
+        with self._stats_lock:
+            out = dict(self.stats)
+        out['mode'] = cfg.get('mode', 'off')
+        out['frag_expired'] = self._frags.expired
+        out['socket'] = None if self._sock_key is None else {
+            'multicast': self._sock_key[0], 'port': self._sock_key[1], 'ttl': self._sock_key[2],
+            'interface': self._sock_key[3] or None, 'open': self._transport is not None, 'error': self._sock_error}
+        try:
+            from app_context import AppContext
+            persist = AppContext.current().get_persist_stats()
+            out['persisted'] = persist['writes']
+            out['persist_pending'] = persist['pending']
+        except Exception:
+            pass
+        if out['mode'] == 'master':
+            out.update(epoch=self.epoch, seq=self._seq, hash=self._hash)
+            if cfg.get('port_state'):
+                out['port_feed'] = {'version': self._ports_ver}
+        else:
+            out.update(epoch=self._rx['epoch'], seq=self._rx['seq'], hash=self._rx['hash'])
+            if cfg.get('port_state'):
+                pf = self._pf
+                out['port_feed'] = {'epoch': pf['epoch'], 'version': pf['ver'], 'stale': pf['stale'],
+                                    'ports': len(pf['ports']),
+                                    'age_s': None if pf['at'] is None else round(time.monotonic() - pf['at'], 3)}
+        out['clock'] = self.clock.get_stats()
+        return out
+
+    # ---- master ----
+    def _refresh_master(self, cfg):
+        """Re-encode the map when the config generation moved; a changed map gets a new seq."""
+        gen = getattr(cfg, 'generation', None)
+        if gen is not None and gen == self._gen and self._body is not None:
+            return False
+        self._gen = gen
+        body = encode_colors(cfg.get('vlan_colors', {}))
+        if body == self._body:
+            return False
+        self._body, self._hash = body, config_hash(body)
+        self._seq += 1
+        return True
+
+    async def _main(self):
+        next_hb = 0.0
+        while not self._stopping:
             cfg = self.cfg_provider()
-            if cfg['sync']['mode'] == 'master':
-                payload = {'type':'vlan_colors','vlan_colors':cfg.get('vlan_colors',{}),'ts':time.time()}
-                try: self._send(payload, cfg['sync']['multicast'], cfg['sync']['port'])
-                except Exception: pass
-            self._stop.wait(1.0)
-    def _rx_loop(self):
-        while not self._stop.is_set():
+            sc = cfg.get('sync') or {}
+            hb = max(0.1, float(sc.get('heartbeat_sec', DEFAULT_HEARTBEAT)))
+            now = time.monotonic()
+            due = now + hb
+            if sc.get('mode') not in ('master', 'slave'):
+                self._close_socket()
+                self._sock_key = None
+                due = now + 5.0     # idle; config changes also kick()
+            elif not await self._ensure_socket(sc):
+                due = now + 5.0
+            elif sc.get('mode') == 'master':
+                try:
+                    changed = self._refresh_master(cfg)
+                    if changed or self._resend:
+                        self._resend = False
+                        self._send_all(pack_messages(MSG_COLORS, self.epoch, self._seq, self._hash, self._body), sc)
+                        self._count(tx_full=1)
+                        next_hb = now + hb
+                    elif now >= next_hb:
+                        self._send_all(pack_messages(MSG_HEARTBEAT, self.epoch, self._seq, self._hash), sc)
+                        self._count(tx_heartbeats=1)
+                        next_hb = now + hb
+                    due = next_hb
+                    if sc.get('port_state') and self.bus is not None:
+                        self._send_ports(sc, now)
+                        due = min(due, self._ports_snap_due)
+                except Exception as e:
+                    self._count(errors=1)
+                    print(f"[sync] send failed: {e}")
+            elif sc.get('mode') == 'slave':
+                if now >= self._time_due:
+                    self._send_time_request(sc)
+                    self._time_due = now + max(0.2, float(sc.get('time_interval_sec', DEFAULT_TIME_INTERVAL)))
+                due = self._time_due
+            feed_due = self._check_port_feed()
+            if feed_due is not None:
+                due = min(due, feed_due)
+            if sc.get('mode') != 'slave' and self.clock.synced:
+                self.clock.reset()      # no longer following: back to the local clock
             try:
-                self._sock_rx.settimeout(1.0)
-                data, addr = self._sock_rx.recvfrom(8192)
-            except Exception:
-                continue
-            try: msg = json.loads(data.decode('utf-8','ignore'))
-            except Exception: continue
-            if msg.get('type') == 'vlan_colors':
-                cfg = self.cfg_provider()
-                if cfg['sync']['mode'] == 'slave':
-                    cfg['vlan_colors'] = msg.get('vlan_colors', {})
-                    try:
-                        from app_context import AppContext
-                        AppContext.current().save_cfg(cfg)
-                    except Exception: pass
-    def _send(self, obj, maddr, port):
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-        s.sendto(json.dumps(obj).encode('utf-8'), (maddr, int(port)))
-        s.close()
+                await asyncio.wait_for(self._kick.wait(), max(0.01, due - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+
+    def _send_ports(self, sc, now):
+        """Master: port changes since the last send as a delta; a full snapshot when due or asked for."""
+        bus = self.bus
+        full = self._ports_full or self._ports_ver is None or now >= self._ports_snap_due
+        if not full:
+            if bus.version == self._ports_ver:
+                return
+            cur, changed, removed, full = bus.changes_since(self._ports_ver)
+            if not full:
+                body = [encode_port(p, s) for p, s in sorted(changed.items())] + [encode_port(p, None) for p in removed]
+                self._send_all(pack_messages(MSG_PORTS, self.epoch, cur, self._ports_ver, body), sc)
+                self._ports_ver = cur
+                self._count(tx_port_deltas=1)
+                return
+        cur, view = bus.snapshot()
+        body = [encode_port(p, s) for p, s in sorted(view.items())]
+        self._send_all(pack_messages(MSG_PORTS_FULL, self.epoch, cur, 0, body), sc)
+        self._ports_ver = cur
+        self._ports_full = False
+        self._ports_snap_due = now + max(0.5, float(sc.get('port_snapshot_sec', DEFAULT_PORT_SNAPSHOT)))
+        self._count(tx_port_snapshots=1)
+
+    # ---- receive ----
+    def _on_datagram(self, data, addr, t_recv):
+        self._count(rx_packets=1, rx_bytes=len(data))
+        try:
+            self._handle(data, addr, t_recv)
+        except Exception:
+            self._count(errors=1)
+
+    def _handle(self, data, addr, t_recv=None):
+        sc = self.cfg_provider().get('sync') or {}
+        mode = sc.get('mode')
+        if data[:1] == b'{':
+            self._handle_legacy(data, mode)
+            return
+        msg = unpack_message(data)
+        if msg is None:
+            self._count(rx_bad=1)
+            return
+        mtype, epoch, seq, chash, frag, nfrag, body = msg
+        if mode == 'master':
+            now = time.monotonic()
+            if mtype == MSG_TIME_REQ and len(body) >= TIME.size:
+                t1 = TIME.unpack_from(body)[0]
+                self._send_all(pack_messages(MSG_TIME_RESP, epoch, seq, 0, TIME.pack(t1, time.time())), sc)
+                self._count(time_replies=1)
+            elif mtype == MSG_RESYNC and now - self._last_resend >= RESYNC_MIN_GAP:
+                self._last_resend = now
+                self._resend = True
+                self._count(resync_requests=1)
+                self._kick.set()
+            elif mtype == MSG_PORTS_RESYNC and now - self._last_ports_resend >= RESYNC_MIN_GAP:
+                self._last_ports_resend = now
+                self._ports_full = True
+                self._count(port_resync_requests=1)
+                self._kick.set()
+            return
+        if mode != 'slave' or mtype in (MSG_RESYNC, MSG_PORTS_RESYNC, MSG_TIME_REQ):
+            return
+        if mtype == MSG_TIME_RESP:
+            # replies go to the whole group: only take our own, and only the latest request
+            if epoch == self.epoch and seq == self._time_seq and len(body) >= TIME.size:
+                t1, t2 = TIME.unpack_from(body)
+                self.clock.sample(t1, t2, t_recv)
+            return
+        if mtype in (MSG_PORTS, MSG_PORTS_FULL):
+            if sc.get('port_state'):
+                self._handle_ports(mtype, epoch, seq, chash, frag, nfrag, body, addr, sc)
+            return
+        rx = self._rx
+        if mtype == MSG_HEARTBEAT:
+            if epoch != rx['epoch'] or seq > rx['seq'] or chash != rx['hash']:
+                self._request_resync(sc)
+            return
+        if mtype != MSG_COLORS:
+            return
+        if epoch == rx['epoch'] and seq <= rx['seq']:
+            if frag == 0:   # once per message, not per fragment
+                self._count(**{'duplicates' if seq == rx['seq'] else 'out_of_order': 1})
+            return
+        if nfrag > 1:
+            body = self._frags.add((addr[0], mtype, epoch, seq), frag, nfrag, body, time.monotonic())
+            if body is None:
+                return
+        if config_hash(body) != chash:
+            self._count(hash_mismatch=1)
+            return
+        rx.update(epoch=epoch, seq=seq, hash=chash)
+        self._apply(decode_colors(body))
+
+    def _handle_legacy(self, data, mode):
+        """JSON map from a master running the old format (kept for mixed-version upgrades)."""
+        self._count(rx_legacy=1)
+        if mode != 'slave':
+            return
+        msg = json.loads(data.decode('utf-8', 'ignore'))
+        if msg.get('type') == 'vlan_colors':
+            self._apply(msg.get('vlan_colors', {}))
+
+    # ---- port state feed (followers) ----
+    def _handle_ports(self, mtype, epoch, seq, base, frag, nfrag, body, addr, sc):
+        pf = self._pf
+        same = epoch == pf['epoch']
+        if mtype == MSG_PORTS:
+            if same and seq <= pf['ver']:
+                if frag == 0:
+                    self._count(port_duplicates=1)
+                return
+            if not same or base != pf['ver'] or pf['stale']:
+                # missed a delta (or the feed was lost): wait for a full snapshot
+                if frag == 0:
+                    self._count(port_gaps=1)
+                self._request_ports_resync(sc)
+                return
+        elif same and seq < pf['ver']:
+            if frag == 0:
+                self._count(port_duplicates=1)
+            return
+        if nfrag > 1:
+            body = self._frags.add((addr[0], mtype, epoch, seq), frag, nfrag, body, time.monotonic())
+            if body is None:
+                return
+        pf.update(epoch=epoch, ver=seq, at=time.monotonic(), stale=False)
+        if mtype == MSG_PORTS:
+            self._count(rx_port_deltas=1)
+        else:
+            self._count(rx_port_snapshots=1)
+        self._publish_ports(decode_ports(body), full=(mtype == MSG_PORTS_FULL))
+
+    def _publish_ports(self, ports, full):
+        """Push received ports into the local bus; only ports that differ count as changes."""
+        if self.bus is None:
+            return
+        _, view = self.bus.snapshot()
+        updates = {p: s for p, s in ports.items() if s is not None and view.get(p) != s}
+        removed = [p for p, s in ports.items() if s is None]
+        if full:
+            removed += [p for p in self._pf['ports'] if p not in ports]
+        self._pf['ports'] = (self._pf['ports'] | set(updates)) - set(removed)
+        if updates or removed:
+            self.bus.publish(updates, None, removed)
+
+    def _check_port_feed(self):
+        """
+        Follower: flag every port stale when the feed goes quiet; drop them when
+        following stops. Returns when to check again (monotonic) or None.
+        """
+        pf = self._pf
+        cfg = self.cfg_provider()
+        if not follows_ports(cfg):
+            if pf['ports'] and self.bus is not None:
+                self.bus.publish({}, (), list(pf['ports']))
+            pf.update(ports=set(), epoch=None, ver=0, at=None, stale=False)
+            return None
+        limit = float((cfg.get('sync') or {}).get('port_stale_sec', DEFAULT_PORT_STALE))
+        if pf['stale'] or pf['at'] is None:
+            return None
+        if time.monotonic() - pf['at'] <= limit:
+            return pf['at'] + limit + 0.01
+        pf['stale'] = True
+        self._count(port_feed_stale=1)
+        print("[sync] port state feed lost; ports flagged stale")
+        if self.bus is not None:
+            _, view = self.bus.snapshot()
+            updates = {p: dict(view[p], stale=True) for p in pf['ports'] if p in view}
+            if updates:
+                self.bus.publish(updates)
+        return None
+
+    def _request_ports_resync(self, sc):
+        now = time.monotonic()
+        if now - self._last_ports_resync < RESYNC_MIN_GAP:
+            return
+        self._last_ports_resync = now
+        try:
+            self._send_all(pack_messages(MSG_PORTS_RESYNC, 0, self._pf['ver'], 0), sc)
+        except Exception:
+            self._count(errors=1)
+
+    def _send_time_request(self, sc):
+        self._time_seq = (self._time_seq + 1) & 0xFFFFFFFF
+        try:
+            self._send_all(pack_messages(MSG_TIME_REQ, self.epoch, self._time_seq, 0,
+                                         TIME.pack(time.monotonic(), 0.0)), sc)
+            self._count(time_requests=1)
+        except Exception:
+            self._count(errors=1)
+
+    def _request_resync(self, sc):
+        now = time.monotonic()
+        if now - self._last_resync < RESYNC_MIN_GAP:
+            return
+        self._last_resync = now
+        try:
+            self._send_all(pack_messages(MSG_RESYNC, 0, self._rx['seq'], 0), sc)
+            self._count(tx_resync=1)
+        except Exception:
+            self._count(errors=1)
+
+    def _apply(self, colors):
+        """
+        Use received colours in memory at once; the config file is written
+        once updates have been quiet for sync.persist_delay_sec, and only if it differs.
+        """
+        try:
+            from app_context import AppContext
+            ctx = AppContext.current()
+            cur = ctx.get_cfg()
+            if encode_colors(colors) == encode_colors(cur.get('vlan_colors', {})):
+                self._count(unchanged=1)
+                return
+            delay = float((cur.get('sync') or {}).get('persist_delay_sec', DEFAULT_PERSIST_DELAY))
+            ctx.apply_cfg({'vlan_colors': colors}, persist_after=delay)
+            self._count(applied=1)
+        except Exception:
+            self._count(errors=1)
+
+    def _send_all(self, packets, sc):
+        for p in packets:
+            self._send(p, sc['multicast'], sc['port'])
+            self._count(tx_packets=1, tx_bytes=len(p))
+
+    def _send(self, data, maddr, port):
+        if self._transport is None:
+            raise OSError("sync socket not open")
+        self._transport.sendto(data, (maddr, int(port)))